@@ -0,0 +1,207 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# share of clicks by organic position, positions past the end get none
+CTR_CURVE = {
+    1: 0.317,
+    2: 0.247,
+    3: 0.186,
+    4: 0.136,
+    5: 0.095,
+    6: 0.062,
+    7: 0.042,
+    8: 0.031,
+    9: 0.030,
+    10: 0.025,
+    **{rank: 0.010 for rank in range(11, 21)},
+}
+
+
+def ctr(ranks, curve: dict = CTR_CURVE) -> np.ndarray:
+    """expected click through rate of each rank, 0 for missing or unlisted ranks"""
+    table = np.zeros(max(curve) + 2)
+    for rank, rate in curve.items():
+        table[rank] = rate
+    ranks = pd.to_numeric(pd.Series(ranks), errors="coerce").to_numpy(
+        dtype=float, na_value=0
+    )
+    ranks = np.where((ranks >= 1) & (ranks < len(table)), ranks, 0).astype(int)
+    return table[ranks]
+
+
+def hosts(urls: pd.Series) -> pd.Series:
+    """host of each URL without the scheme or www., ex: https://www.rocket.com/a"""
+    return (
+        urls.astype("string")
+        .str.lower()
+        .str.replace(r"^[a-z]+://", "", regex=True)
+        .str.replace(r"^www\.", "", regex=True)
+        .str.split("/", n=1)
+        .str[0]
+    )
+
+
+def site_hosts(kw: pd.DataFrame) -> dict:
+    """{Domain: host}, the most common host of each site's keyword_df Google_Url"""
+    ranking = kw.assign(host=hosts(kw["Google_Url"])).dropna(subset=["host"])
+    ranking = ranking.loc[ranking["host"] != ""]
+    return (
+        ranking.groupby("Domain", observed=True)["host"]
+        .agg(lambda x: x.mode()[0])
+        .to_dict()
+    )
+
+
+def explode_tags(kw: pd.DataFrame) -> pd.DataFrame:
+    """one row per (keyword, tag) from the comma separated KeywordTags, as Tag"""
+    tags = kw["KeywordTags"].astype("string").str.split(",")
+    kw = kw.assign(Tag=tags).explode("Tag")
+    kw["Tag"] = kw["Tag"].str.strip()
+    return kw.loc[kw["Tag"].notna() & (kw["Tag"] != "")]
+
+
+def _keywords(kw: pd.DataFrame, by: str) -> pd.DataFrame:
+    """keyword_df rows with a str keyword_id, exploded by tag when grouping by Tag"""
+    kw = kw.assign(keyword_id=kw["Id"].astype(str))
+    return explode_tags(kw) if by == "Tag" else kw
+
+
+def serp_features(serps: pd.DataFrame) -> pd.DataFrame:
+    """
+    long table of the features in a serps_df table,
+    one row per (keyword_id, date, Rank, Url, feature)
+    """
+    columns = [c for c in serps.columns if str(c).startswith("serp_feature_")]
+    ids = [c for c in ("keyword_id", "date", "Rank", "Url") if c in serps]
+    features = serps[ids + columns].melt(id_vars=ids, value_name="feature")
+    features = features.drop(columns="variable").dropna(subset=["feature"])
+    features["feature"] = features["feature"].astype(str)
+    features["keyword_id"] = features["keyword_id"].astype(str)
+    return features.drop_duplicates()
+
+
+def feature_ownership(
+    serps: pd.DataFrame,
+    kw: pd.DataFrame,
+    by: str = "Domain",
+    site_host: Optional[dict] = None,
+    ignore: tuple = ("regular",),
+) -> pd.DataFrame:
+    """
+    how often each SERP feature shows up for a site's (or tag's) keywords
+    and how often the site owns it
+    serps is a serps_df table, kw a keyword_df table with Domain,
+    a feature is owned when one of the results carrying it is on the site's host
+    site_host is {Domain: host}, by default each site's most common ranking host
+
+    returns one row per (by, date, feature) with Keywords (with a SERP that day),
+    WithFeature, Owned, AppearanceRate (WithFeature / Keywords)
+    and OwnershipRate (Owned / WithFeature)
+    """
+    site_host = site_hosts(kw) if site_host is None else site_host
+    kw = _keywords(kw, by)
+    features = serp_features(serps)
+    features = features.loc[~features["feature"].isin(ignore)]
+    features["host"] = hosts(features["Url"])
+    dates = ["date"] if "date" in serps else []
+
+    # a keyword can be tracked by more than one site (or tag), each gets its own row
+    columns = list(dict.fromkeys(["keyword_id", "Domain", by]))
+    rows = features.merge(kw[columns].drop_duplicates(), on="keyword_id")
+    rows["owned"] = rows["host"].eq(rows["Domain"].map(site_host)).fillna(False)
+    groups = [by] + dates + ["feature"]
+    per_keyword = rows.groupby(groups + ["keyword_id"], observed=True)["owned"].any()
+    summary = per_keyword.groupby(level=groups, observed=True).agg(["size", "sum"])
+    summary.columns = ["WithFeature", "Owned"]
+    summary = summary.reset_index()
+
+    # only keywords with a SERP pulled can show a feature
+    pulled = serps[["keyword_id"] + dates].assign(
+        keyword_id=serps["keyword_id"].astype(str)
+    )
+    pulled = pulled.drop_duplicates().merge(
+        kw[list(dict.fromkeys(["keyword_id", by]))].drop_duplicates(), on="keyword_id"
+    )
+    tracked = pulled.groupby([by] + dates, observed=True)["keyword_id"].nunique()
+    summary = summary.merge(
+        tracked.rename("Keywords"), left_on=[by] + dates, right_index=True
+    )
+    summary["AppearanceRate"] = summary["WithFeature"] / summary["Keywords"]
+    summary["OwnershipRate"] = summary["Owned"] / summary["WithFeature"]
+    columns = groups + [
+        "Keywords",
+        "WithFeature",
+        "Owned",
+        "AppearanceRate",
+        "OwnershipRate",
+    ]
+    return summary[columns].sort_values(groups, ignore_index=True)
+
+
+def _volume(kw: pd.DataFrame) -> pd.Series:
+    """regional search volume, global where there is no regional number"""
+    regional = pd.to_numeric(kw["RegionalSearchVolume"], errors="coerce")
+    return regional.fillna(
+        pd.to_numeric(kw["GlobalSearchVolume"], errors="coerce")
+    ).fillna(0)
+
+
+def share_of_voice(
+    kw: pd.DataFrame, by: str = "Domain", curve: dict = CTR_CURVE
+) -> pd.DataFrame:
+    """
+    share of voice of a site (or tag) from its own keyword_df ranks
+    each keyword is worth ctr(rank) x search volume, Share is that as a % of
+    what ranking first for every keyword would be worth
+    returns one row per (by, SERP Date) with Keywords, Volume, Voice and Share
+    """
+    kw = _keywords(kw, by)
+    volume = _volume(kw)
+    kw = kw.assign(
+        Volume=volume,
+        Voice=ctr(kw["Google_Rank"], curve) * volume.to_numpy(),
+        Best=curve[1] * volume,
+    )
+    groups = [by, "SERP Date"] if "SERP Date" in kw else [by]
+    summary = kw.groupby(groups, observed=True).agg(
+        Keywords=("keyword_id", "nunique"),
+        Volume=("Volume", "sum"),
+        Voice=("Voice", "sum"),
+        Best=("Best", "sum"),
+    )
+    summary["Share"] = (summary["Voice"] / summary["Best"] * 100).fillna(0)
+    return summary.drop(columns="Best").reset_index()
+
+
+def serp_share_of_voice(
+    serps: pd.DataFrame,
+    kw: pd.DataFrame,
+    by: str = "Domain",
+    curve: dict = CTR_CURVE,
+    top: Optional[int] = 10,
+) -> pd.DataFrame:
+    """
+    share of voice of every host on a site's (or tag's) SERPs, like STAT's /sov
+    each result is worth ctr(Rank) x the keyword's search volume,
+    Share is a host's % of the voice of every result for the group's keywords
+    returns the top hosts per (by, date) with Voice and Share
+    """
+    kw = _keywords(kw, by)
+    kw = kw.assign(Volume=_volume(kw))[["keyword_id", by, "Volume"]].drop_duplicates()
+    results = serps[["keyword_id", "date", "Rank", "Url"]].assign(
+        keyword_id=serps["keyword_id"].astype(str), host=hosts(serps["Url"])
+    )
+    rows = results.merge(kw, on="keyword_id")
+    rows["Voice"] = ctr(rows["Rank"], curve) * rows["Volume"].to_numpy()
+
+    voice = (
+        rows.groupby([by, "date", "host"], observed=True)["Voice"].sum().reset_index()
+    )
+    total = voice.groupby([by, "date"], observed=True)["Voice"].transform("sum")
+    voice["Share"] = (voice["Voice"] / total * 100).fillna(0)
+    voice = voice.sort_values([by, "date", "Voice"], ascending=[True, True, False])
+    if top is not None:
+        voice = voice.groupby([by, "date"], observed=True).head(top)
+    return voice.reset_index(drop=True)
@@ -0,0 +1,128 @@
+import asyncio
+import datetime as dt
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, Union
+
+from getstat import STAT, normalize_keyword_ids
+
+
+class AsyncSTAT:
+    def __init__(self, api_key: str, concurrency: int = 10, **kwargs) -> None:
+        """
+        asyncio version of the STAT class
+
+        each call runs on the pooled STAT session in a worker thread,
+        concurrency caps how many requests are in flight at the same time
+        any extra keyword arguments are passed through to STAT
+        """
+        kwargs.setdefault("pool_size", concurrency)
+        self.stat = STAT(api_key, **kwargs)
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def __aenter__(self) -> "AsyncSTAT":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """shuts down the worker threads and closes the underlying STAT session"""
+        self._executor.shutdown(wait=True)
+        self.stat.close()
+
+    def _set_start(self, start: int):
+        """sets the starting point of the API requests"""
+        self.stat._set_start(start)
+
+    def _set_results(self, results: int):
+        """changes the results per page you'd like to get"""
+        self.stat._set_results(results)
+
+    def _set_search_engine(self, engine: str):
+        """sets the desired search engine, defaults to google"""
+        self.stat._set_search_engine(engine)
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        """
+        runs a blocking STAT method in the thread pool
+        the pool has concurrency threads, so that many calls run at once
+        and the rest wait,
+        whichever event loop they come from
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def gather(
+        self, calls: Iterable[Awaitable], return_exceptions: bool = False
+    ) -> list:
+        """
+        runs many calls at once and returns their results in order
+        ex: await a.gather(a.serp(k) for k in keyword_ids)
+        """
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+    async def _sov(
+        self,
+        tag_or_sites: str,
+        id: Union[int, str],
+        start_date: dt.date,
+        end_date: dt.date,
+    ) -> list:
+        """main function for pulling tag/site Share of Voice"""
+        return await self._run(self.stat._sov, tag_or_sites, id, start_date, end_date)
+
+    async def _rank(
+        self,
+        tag_or_sites: str,
+        id: Union[int, str],
+        start_date: dt.date,
+        end_date: dt.date,
+    ) -> list:
+        """main function for pulling tag/site ranking distributions"""
+        return await self._run(self.stat._rank, tag_or_sites, id, start_date, end_date)
+
+    async def get_sites(self) -> list:
+        """lists all sites you have access to"""
+        return await self._run(self.stat.get_sites)
+
+    async def get_tags(self, site_id: str) -> list:
+        """lists all tags for a site ID"""
+        return await self._run(self.stat.get_tags, site_id)
+
+    async def serp(
+        self,
+        keyword_id: Union[int, str],
+        date: dt.date = dt.date.today() - dt.timedelta(days=1),
+        raw: bool = False,
+    ) -> list:
+        """pulls the SERP of a keyword ID for a day (defaults to yesterday)"""
+        return await self._run(self.stat.serp, keyword_id, date, raw=raw)
+
+    async def keyword_ranks(
+        self,
+        keyword_id: Union[int, str],
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> list:
+        """returns ranking list for a given keyword and date range"""
+        return await self._run(
+            self.stat.keyword_ranks, keyword_id, start_date, end_date
+        )
+
+    async def keywords(self, site_id: Union[int, str], raw: bool = False) -> list:
+        """returns a list of keywords for a given site id"""
+        return await self._run(self.stat.keywords, site_id, raw=raw)
+
+    async def serps(
+        self,
+        keyword_ids: Iterable[Union[int, str]],
+        date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> dict:
+        """pulls the SERP of every keyword ID for one day, returns {keyword_id: serp}"""
+        keyword_ids = normalize_keyword_ids(keyword_ids)
+        results = await self.gather(self.serp(k, date) for k in keyword_ids)
+        return dict(zip(keyword_ids, results))
@@ -0,0 +1,62 @@
+"""
+measures how long importing each module takes in a fresh interpreter,
+and which heavy dependencies the import pulls in
+
+python benchmarks/bench_import.py --repeat 5 getstat asyncstat util rocket
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# dependencies that should only load when something needs them
+HEAVY = ("pandas", "numpy", "pyarrow", "rich", "googlewrapper")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_import(module: str) -> tuple:
+    """(seconds, heavy modules loaded) for importing module in a new interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, _, loaded = result.stdout.strip().partition(" ")
+    return float(elapsed), loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "modules", nargs="*", default=["getstat", "asyncstat", "sync", "util", "rocket"]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<12} {'median ms':>10} {'min ms':>8}  heavy imports")
+    for module in args.modules:
+        try:
+            runs = [time_import(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<12} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        times = [elapsed * 1000 for elapsed, _ in runs]
+        median, fastest = statistics.median(times), min(times)
+        print(f"{module:<12} {median:>10.1f} {fastest:>8.1f}  {runs[-1][1] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+compares util.keyword_df against the previous apply(pd.Series) implementation
+
+python benchmarks/bench_keyword_df.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from synthetic import keywords  # noqa: E402
+from util import keyword_df  # noqa: E402
+
+
+def legacy_keyword_df(kw: list) -> pd.DataFrame:
+    """the row by row apply(pd.Series) version keyword_df replaced"""
+    kw_df = pd.DataFrame(kw)
+    rank = kw_df["KeywordRanking"].apply(pd.Series)
+    google = rank["Google"].apply(pd.Series)
+    google.columns = [f"Google_{x}" for x in google.columns]
+    kw_df["SERP Date"] = pd.to_datetime(rank["date"])
+    kw_df[google.columns] = google
+    kw_df[["Google_BaseRank", "Google_Rank"]] = kw_df[
+        ["Google_BaseRank", "Google_Rank"]
+    ].astype(float)
+    stats = kw_df["KeywordStats"].apply(pd.Series)
+    stats_columns = [
+        "AdvertiserCompetition",
+        "GlobalSearchVolume",
+        "RegionalSearchVolume",
+        "CPC",
+    ]
+    kw_df[stats_columns] = stats[stats_columns].astype(float)
+    local_search_trends = stats["LocalSearchTrendsByMonth"].apply(pd.Series)
+    local_search_trends.columns = [
+        f"trend_{x.lower()}" for x in local_search_trends.columns
+    ]
+    kw_df[local_search_trends.columns] = local_search_trends.astype(int)
+    tags = kw_df["KeywordTags"].str.split(",", expand=True)
+    tags.columns = [f"Tag_{x}" for x in tags.columns]
+    kw_df[tags.columns] = tags
+    return kw_df
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--skip-legacy-over",
+        type=int,
+        default=None,
+        help="don't time the legacy version above this many rows",
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy (s)':>12} {'keyword_df (s)':>15} {'speedup':>8}")
+    for n in args.sizes:
+        kw = keywords(n)
+        # compare the untyped output, the schema is a separate (cheap) step
+        new_time, new = timed(keyword_df, kw, False)
+        if args.skip_legacy_over and n > args.skip_legacy_over:
+            print(f"{n:>10} {'-':>12} {new_time:>15.2f} {'-':>8}")
+            continue
+        old_time, old = timed(legacy_keyword_df, kw)
+        pd.testing.assert_frame_equal(old, new)
+        print(
+            f"{n:>10} {old_time:>12.2f} {new_time:>15.2f} {old_time / new_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
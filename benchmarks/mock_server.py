@@ -0,0 +1,208 @@
+"""
+local fake of the STAT API serving synthetic, paginated data
+
+with MockSTATServer(sites=5, keywords_per_site=5000, latency=0.02) as server:
+    s = STAT("any-key", base_url=server.base_url)
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import synthetic
+
+
+class MockSTATServer:
+    def __init__(
+        self,
+        sites: int = 5,
+        tags_per_site: int = 20,
+        keywords_per_site: int = 1000,
+        serp_results: int = 100,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        """
+        latency is the seconds added to every response,
+        error_rate / throttle_rate are the share of requests answered with a 500 / 429
+        port 0 picks a free port, see base_url once started
+        """
+        self.sites = sites
+        self.tags_per_site = tags_per_site
+        self.keywords_per_site = keywords_per_site
+        self.serp_results = serp_results
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._keywords = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v2"
+
+    def start(self) -> "MockSTATServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockSTATServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def site_keywords(self, site_id: int) -> list:
+        """the (cached) keyword records of a site, IDs are unique across sites"""
+        with self._lock:
+            if site_id not in self._keywords:
+                rng = random.Random(self.seed + site_id)
+                first = site_id * self.keywords_per_site
+                date = dt.date.today() - dt.timedelta(days=1)
+                self._keywords[site_id] = [
+                    synthetic.keyword(first + i, date, rng)
+                    for i in range(self.keywords_per_site)
+                ]
+            return self._keywords[site_id]
+
+    def site_tags(self, site_id: int) -> list:
+        rng = random.Random(self.seed + site_id)
+        ids = [k["Id"] for k in self.site_keywords(site_id)]
+        tags = list(synthetic.TAGS) + [f"tag {i}" for i in range(self.tags_per_site)]
+        return [
+            {
+                "Id": str(site_id * 1000 + i),
+                "Tag": tag,
+                "Keywords": {"Id": rng.sample(ids, min(len(ids), rng.randint(1, 50)))},
+            }
+            for i, tag in enumerate(tags[: self.tags_per_site])
+        ]
+
+    def _results(self, endpoint: str, params: dict) -> Optional[list]:
+        """every record for the endpoint, before pagination"""
+        key = f"{self.seed}{endpoint}{sorted(params.items())}"
+        rng = random.Random(zlib.crc32(key.encode()))
+        today = dt.date.today()
+        start = dt.date.fromisoformat(params.get("from_date", today.isoformat()))
+        end = dt.date.fromisoformat(params.get("to_date", today.isoformat()))
+        id = int(
+            params.get("id") or params.get("site_id") or params.get("keyword_id") or 0
+        )
+        if endpoint == "/sites/all":
+            return [
+                {"Id": str(i), "Title": f"Site {i}", "Url": f"www.site-{i}.com"}
+                for i in range(1, self.sites + 1)
+            ]
+        if endpoint == "/tags/list":
+            return self.site_tags(id)
+        if endpoint == "/keywords/list":
+            return self.site_keywords(id)
+        if endpoint == "/serps/show":
+            date = dt.date.fromisoformat(params.get("date", today.isoformat()))
+            return synthetic.serp(id, date, rng, self.serp_results)
+        if endpoint == "/rankings/list":
+            return synthetic.rankings(id, start, end, rng)
+        if endpoint in ("/sites/sov", "/tags/sov"):
+            return synthetic.sov(id, start, end, rng)
+        if endpoint in ("/sites/ranking_distributions", "/tags/ranking_distributions"):
+            return synthetic.ranking_distributions(id, start, end, rng)
+        if endpoint in ("/projects/list", "/subaccounts/list"):
+            return [{"Id": "1", "Name": "Mock", "ApiKey": "mock-key"}]
+        return None
+
+    def respond(self, path: str) -> tuple[int, dict]:
+        """(status, body) for a request path"""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if roll < self.throttle_rate:
+            return 429, {"Response": {"responsecode": "429"}}
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, {"Response": {"responsecode": "500"}}
+
+        parts = urlsplit(path)
+        # /api/v2/{key}/{endpoint}
+        endpoint = "/" + "/".join(parts.path.split("/")[4:])
+        params = dict(parse_qsl(parts.query))
+        results = self._results(endpoint, params)
+        if results is None:
+            return 404, {"Response": {"responsecode": "404"}}
+
+        start = int(params.get("start", 0))
+        per_page = int(params.get("results", 1000))
+        page = results[start : start + per_page]
+        body = {
+            "responsecode": "200",
+            "resultsreturned": str(len(page)),
+            "totalresults": str(len(results)),
+            "Result": page,
+        }
+        if start + per_page < len(results):
+            following = {**params, "start": start + per_page, "results": per_page}
+            body["nextpage"] = f"{endpoint}?{urlencode(following)}"
+        return 200, {"Response": body}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, body = server.respond(self.path)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="run the mock STAT API until stopped")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sites", type=int, default=5)
+    parser.add_argument("--keywords", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = MockSTATServer(
+        sites=args.sites,
+        keywords_per_site=args.keywords,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        port=args.port,
+    )
+    print(f"mock STAT API on {server.base_url}", flush=True)
+    server.start()._thread.join()
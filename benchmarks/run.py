@@ -0,0 +1,201 @@
+"""
+end to end benchmarks of the client and the rocket pipelines against the mock STAT API
+reports throughput, request latency percentiles and peak (Python) memory per scenario
+
+the mock server runs in its own process so it doesn't share the GIL with the client,
+each scenario is timed in one pass and its memory is traced in a second one,
+tracemalloc slows down every allocation it traces
+
+python benchmarks/run.py --sites 10 --keywords 5000 --latency 0.02
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import datetime as dt
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from collector import collect_sites_parallel, combine  # noqa: E402
+from getstat import STAT  # noqa: E402
+from pipeline import StreamingPipeline  # noqa: E402
+from util import collect_sites, get_sites, serp_batch  # noqa: E402
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+@contextmanager
+def mock_server(args):
+    """runs mock_server.py in a subprocess, yields its base_url"""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(os.path.dirname(__file__), "mock_server.py"),
+            "--port=0",
+            f"--sites={args.sites}",
+            f"--keywords={args.keywords}",
+            f"--latency={args.latency}",
+            f"--error-rate={args.error_rate}",
+            f"--throttle-rate={args.throttle_rate}",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        # the server prints "mock STAT API on {base_url}" once it is listening
+        yield process.stdout.readline().split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def client(base_url: str, args) -> STAT:
+    s = STAT(
+        "bench-key",
+        base_url=base_url,
+        pool_size=args.workers,
+        backoff_factor=0.05,
+    )
+    s._set_results(args.page_size)
+    return s
+
+
+def peak_memory(base_url: str, args, func) -> int:
+    """peak traced memory of func(s) on a fresh client, in bytes"""
+    s = client(base_url, args)
+    tracemalloc.start()
+    func(s)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    s.close()
+    return peak
+
+
+def measure(name: str, base_url: str, args, func) -> dict:
+    """
+    runs func(s) on a fresh client timing every request it makes,
+    then again on another client for its peak memory
+    """
+    s = client(base_url, args)
+    latencies = []
+    s.session.hooks["response"].append(
+        lambda r, *a, **k: latencies.append(r.elapsed.total_seconds())
+    )
+    start = time.perf_counter()
+    records = func(s)
+    seconds = time.perf_counter() - start
+    s.close()
+    peak = peak_memory(base_url, args, func)
+    return {
+        "scenario": name,
+        "seconds": seconds,
+        "requests": len(latencies),
+        "req/s": len(latencies) / seconds if seconds else 0.0,
+        "records": records,
+        "rec/s": records / seconds if seconds else 0.0,
+        "p50 ms": percentile(latencies, 50) * 1000,
+        "p95 ms": percentile(latencies, 95) * 1000,
+        "p99 ms": percentile(latencies, 99) * 1000,
+        "mean ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "peak MB": peak / 1024**2,
+    }
+
+
+def scenarios(args) -> dict:
+    yesterday = dt.date.today() - dt.timedelta(days=1)
+
+    def keywords_list(s):
+        return sum(len(s.keywords(site_id)) for site_id in get_sites(s))
+
+    def keywords_stream(s):
+        return sum(
+            1
+            for site_id in get_sites(s)
+            for _ in s.iter_results(
+                s._define_url("/keywords/list", f"&site_id={site_id}")
+            )
+        )
+
+    def serps(s):
+        keyword_ids = range(args.keywords, args.keywords + args.serps)
+        return len(serp_batch(s, keyword_ids, yesterday))
+
+    def rocket_collect(s):
+        return len(collect_sites(s)[1])
+
+    def rocket_parallel(s):
+        results = collect_sites_parallel(
+            s, fetch_workers=args.workers, parse_workers=args.parse_workers
+        )
+        return len(combine(results)[1])
+
+    def rocket_stream(s):
+        return StreamingPipeline(s, lambda df: None, lambda df: None).run(get_sites(s))[
+            "ranks"
+        ]
+
+    return {
+        "client: keywords (list)": keywords_list,
+        "client: keywords (stream)": keywords_stream,
+        "client: serps_bulk": serps,
+        "rocket: collect_sites": rocket_collect,
+        "rocket: collect_sites_parallel": rocket_parallel,
+        "rocket: streaming pipeline": rocket_stream,
+    }
+
+
+def report(rows: list) -> None:
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(fmt(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(fmt(row[c]).rjust(widths[c]) for c in columns))
+
+
+def fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.1f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sites", type=int, default=5)
+    parser.add_argument("--keywords", type=int, default=5000, help="keywords per site")
+    parser.add_argument("--serps", type=int, default=500, help="SERPs to pull")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="seconds per response"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--parse-workers", type=int, default=0)
+    parser.add_argument(
+        "--only", nargs="*", help="only run scenarios containing these words"
+    )
+    args = parser.parse_args()
+
+    rows = []
+    with mock_server(args) as base_url:
+        for name, func in scenarios(args).items():
+            if args.only and not any(word in name for word in args.only):
+                continue
+            rows.append(measure(name, base_url, args, func))
+    report(rows)
+
+
+if __name__ == "__main__":
+    main()
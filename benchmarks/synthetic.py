@@ -0,0 +1,154 @@
+"""synthetic STAT shaped records for benchmarks"""
+
+import random
+import datetime as dt
+
+MONTHS = (
+    "Mar",
+    "Feb",
+    "Jan",
+    "Dec",
+    "Nov",
+    "Oct",
+    "Sep",
+    "Aug",
+    "Jul",
+    "Jun",
+    "May",
+    "Apr",
+)
+DEVICES = ("desktop", "smartphone")
+TAGS = (
+    "answerbox (all)",
+    "answerbox (owned)",
+    "faq (all)",
+    "faq (owned)",
+    "videos (all)",
+    "mortgage",
+    "refinance",
+    "credit",
+    "renting",
+)
+
+
+def keyword(i: int, date: dt.date, rng: random.Random) -> dict:
+    """one record as returned by /keywords/list"""
+    rank = rng.randint(1, 120)
+    return {
+        "Id": str(i),
+        "Keyword": f"keyword {i}",
+        "KeywordMarket": "US-en",
+        "KeywordLocation": "",
+        "KeywordDevice": rng.choice(DEVICES),
+        "KeywordTranslation": "",
+        "KeywordTags": ",".join(rng.sample(TAGS, rng.randint(1, 4))),
+        "KeywordStats": {
+            "AdvertiserCompetition": f"{rng.random():.2f}",
+            "GlobalSearchVolume": str(rng.randint(10, 100000)),
+            "RegionalSearchVolume": str(rng.randint(10, 50000)),
+            "LocalSearchTrendsByMonth": {m: str(rng.randint(0, 50000)) for m in MONTHS},
+            "CPC": f"{rng.random() * 10:.2f}",
+        },
+        "KeywordRanking": {
+            "date": date.isoformat(),
+            "Google": {
+                "Rank": str(rank),
+                "BaseRank": str(rank),
+                "Url": f"www.example.com/page-{i % 500}",
+            },
+            "Bing": {"Rank": "", "BaseRank": "", "Url": ""},
+        },
+        "CreatedAt": "2021-01-01",
+        "RequestUrl": f"http://app.getstat.com/api/v2/key/keywords/list?id={i}",
+    }
+
+
+def keywords(n: int, date: dt.date = dt.date(2022, 5, 10), seed: int = 0) -> list:
+    """n keyword records"""
+    rng = random.Random(seed)
+    return [keyword(i, date, rng) for i in range(n)]
+
+
+RESULT_TYPES = ("regular", "answerbox", "faq", "videos", "indented", "local", "images")
+
+
+def serp(
+    keyword_id: int, date: dt.date, rng: random.Random, results: int = 100
+) -> list:
+    """the results of one SERP as returned by /serps/show"""
+    serp = []
+    for rank in range(1, results + 1):
+        types = ["regular"]
+        if rng.random() < 0.1:
+            types.append(rng.choice(RESULT_TYPES[1:]))
+        serp.append(
+            {
+                "ResultTypes": {"ResultType": types if len(types) > 1 else types[0]},
+                "Rank": str(rank),
+                "BaseRank": str(rank),
+                "Url": f"www.site-{rng.randint(0, 50)}.com/{keyword_id}/{rank}",
+                "Protocol": "https",
+            }
+        )
+    return serp
+
+
+def days(start: dt.date, end: dt.date) -> list:
+    return [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def rankings(keyword_id: int, start: dt.date, end: dt.date, rng: random.Random) -> list:
+    """daily rankings of one keyword as returned by /rankings/list"""
+    return [
+        {
+            "date": d.isoformat(),
+            "Google": {
+                "Rank": str(rng.randint(1, 120)),
+                "Url": f"www.example.com/{keyword_id}",
+            },
+        }
+        for d in days(start, end)
+    ]
+
+
+def sov(id: int, start: dt.date, end: dt.date, rng: random.Random) -> list:
+    """daily Share of Voice as returned by /sites/sov and /tags/sov"""
+    return [
+        {
+            "date": d.isoformat(),
+            "Sites": {
+                "Site": [
+                    {"Domain": f"www.site-{i}.com", "Share": f"{rng.random() * 20:.2f}"}
+                    for i in range(5)
+                ]
+            },
+        }
+        for d in days(start, end)
+    ]
+
+
+def ranking_distributions(
+    id: int, start: dt.date, end: dt.date, rng: random.Random
+) -> list:
+    """daily rank buckets as returned by /sites/ranking_distributions"""
+    buckets = (
+        "One",
+        "Two",
+        "Three",
+        "Four",
+        "Five",
+        "SixToTen",
+        "ElevenToTwenty",
+        "TwentyOneToThirty",
+        "ThirtyOneToForty",
+        "FortyOneToFifty",
+        "FiftyOneToHundred",
+        "NonRanking",
+    )
+    return [
+        {
+            "date": d.isoformat(),
+            "Google": {b: str(rng.randint(0, 100)) for b in buckets},
+        }
+        for d in days(start, end)
+    ]
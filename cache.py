@@ -0,0 +1,228 @@
+import sqlite3
+import threading
+import time
+import datetime as dt
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from metrics import key_label
+
+DAY = 24 * 60 * 60
+
+# seconds each endpoint's responses stay fresh, None means they never expire
+DEFAULT_TTLS = {
+    "/sites/all": DAY,
+    "/tags/list": DAY,
+    "/projects/list": DAY,
+    "/subaccounts/list": DAY,
+    "/keywords/list": DAY / 2,
+    "/serps/show": DAY,
+    "/rankings/list": DAY,
+    "/sites/sov": DAY,
+    "/tags/sov": DAY,
+    "/sites/ranking_distributions": DAY,
+    "/tags/ranking_distributions": DAY,
+}
+
+# query parameters that don't change what data comes back
+IGNORED_PARAMETERS = ("format",)
+
+# endpoints whose data depends on the account, cached per API key
+ACCOUNT_ENDPOINTS = ("/sites/all", "/projects/list", "/subaccounts/list")
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str = "stat-cache.sqlite",
+        ttls: Optional[dict] = None,
+        default_ttl: Optional[float] = 60 * 60,
+        max_bytes: Optional[int] = 512 * 1024 * 1024,
+    ) -> None:
+        """
+        on disk cache of STAT responses, stored in a local SQLite file
+
+        ttls overrides DEFAULT_TTLS per endpoint, default_ttl is used for anything else
+        anything for a date in the past (old SERPs, closed rank ranges) never expires
+        once the stored bodies go over max_bytes the least recently used are evicted
+        """
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                body TEXT,
+                size INTEGER,
+                created REAL,
+                expires REAL,
+                accessed REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+            CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires);
+            """)
+        self._db.commit()
+        # running total of the stored bodies, so writes never have to scan the table
+        self._bytes = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        # hits are only read, their access times are written by set() or close()
+        self._accessed = {}
+        self._next_sweep = 0.0
+
+    @staticmethod
+    def normalize(url: str) -> tuple[str, dict]:
+        """
+        splits a STAT url into its endpoint and sorted query parameters
+        the API key in the path is dropped so keys can be rotated keeping the cache,
+        except for ACCOUNT_ENDPOINTS which get an account parameter (a hash of the key)
+        so clients of different accounts sharing a cache don't see each other's sites
+        """
+        parts = urlsplit(url)
+        # path looks like {base path}/{API_KEY}/serps/show, whatever the base path is
+        # every STAT endpoint is a /{resource}/{action} pair right after the key
+        path = parts.path.rstrip("/").split("/")
+        api_key, endpoint = path[-3], "/" + "/".join(path[-2:])
+        params = {
+            k: v
+            for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k not in IGNORED_PARAMETERS
+        }
+        if endpoint in ACCOUNT_ENDPOINTS:
+            params["account"] = key_label(api_key)
+        return endpoint, dict(sorted(params.items()))
+
+    def key(self, url: str) -> str:
+        """cache key for a url"""
+        endpoint, params = self.normalize(url)
+        return f"{endpoint}?{urlencode(params)}"
+
+    def _ttl(self, endpoint: str, params: dict) -> Optional[float]:
+        """how long a response is fresh for, None if it never expires"""
+        # historical data doesn't change once the day is over
+        date = params.get("date") or params.get("to_date")
+        if date:
+            try:
+                if dt.date.fromisoformat(date) < dt.date.today():
+                    return None
+            except ValueError:
+                pass
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def get(self, url: str) -> Optional[str]:
+        """returns the cached body for the url, None if it is missing or expired"""
+        now = time.time()
+        key = self.key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            self.hits += 1
+            return row[0]
+
+    def set(self, url: str, body: str) -> None:
+        """stores the body for the url"""
+        endpoint, params = self.normalize(url)
+        ttl = self._ttl(endpoint, params)
+        if ttl == 0:
+            return
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        key = self.key(url)
+        with self._lock:
+            old = self._db.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, len(body), now, expires, now),
+            )
+            self._accessed.pop(key, None)
+            self._flush_accessed()
+            self._bytes += len(body) - (old[0] if old else 0)
+            self._evict(now)
+            self._db.commit()
+
+    def _flush_accessed(self) -> None:
+        """writes the access times of hits since the last set()"""
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed = {}
+
+    def _delete(self, where: str, params: tuple) -> None:
+        """deletes matching rows and takes their size off the running total"""
+        size = self._db.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM responses WHERE {where}", params
+        ).fetchone()[0]
+        if size:
+            self._db.execute(f"DELETE FROM responses WHERE {where}", params)
+            self._bytes -= size
+
+    def _evict(self, now: float, batch: int = 500) -> None:
+        """
+        drops expired entries (at most once a minute), then once over max_bytes
+        the least recently used ones in batches, down to 90% of max_bytes so
+        the next few writes don't have to evict again
+        """
+        if now >= self._next_sweep:
+            self._delete("expires IS NOT NULL AND expires < ?", (now,))
+            self._next_sweep = now + 60
+        if self.max_bytes is None or self._bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        while self._bytes > target:
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT ?", (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            drop = []
+            for key, size in rows:
+                if self._bytes <= target:
+                    break
+                drop.append((key,))
+                self._bytes -= size
+            self._db.executemany("DELETE FROM responses WHERE key = ?", drop)
+
+    def clear(self) -> None:
+        """removes everything from the cache"""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._bytes = 0
+            self._accessed = {}
+
+    def stats(self) -> dict:
+        """hit/miss counters plus what is currently stored"""
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,118 @@
+from getstat import STAT
+from util import concat, get_sites, keyword_count, keyword_df, tag_frame
+
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+import pandas as pd
+
+
+@dataclass
+class SiteResult:
+    """what was collected for one site, error is set if any step for the site failed"""
+
+    site_id: Union[int, str]
+    site_name: str
+    tags: Optional[pd.DataFrame] = None
+    keywords: Optional[pd.DataFrame] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _InlineExecutor(Executor):
+    """runs submitted work straight away, used when parse_workers=0"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def _fetch_site(s: STAT, site_id: Union[int, str]) -> tuple[list, list]:
+    """network half of a site: its raw tags and keywords"""
+    return s.get_tags(site_id), s.keywords(site_id)
+
+
+def collect_sites_parallel(
+    s: STAT,
+    sites: Optional[dict] = None,
+    tag_transform: Optional[Callable[[pd.DataFrame, str], pd.DataFrame]] = None,
+    fetch_workers: int = 8,
+    parse_workers: Optional[int] = 0,
+) -> dict:
+    """
+    collects the tag and keyword tables of util.collect_sites, for many sites at once
+
+    sites are downloaded on a pool of fetch_workers threads, as each one arrives its
+    keywords are parsed with keyword_df, by default in this process
+    parse_workers > 0 (or None for one per CPU) parses on a pool of processes instead,
+    which only pays off once keyword_df costs more than sending keywords to a process
+    a site that fails is kept with its error rather than stopping the run
+
+    returns {site_id: SiteResult}, use combine() to get the (tag, kw) frames
+    when using processes call this from under `if __name__ == "__main__":`
+    """
+    if sites is None:
+        sites = get_sites(s)
+
+    results = {
+        site_id: SiteResult(site_id, site_name) for site_id, site_name in sites.items()
+    }
+    if parse_workers == 0:
+        parse_pool = _InlineExecutor()
+    else:
+        parse_pool = ProcessPoolExecutor(max_workers=parse_workers)
+        # start the worker processes now, forking once the fetch threads are running
+        # can copy a lock one of them holds into the child
+        parse_pool.submit(int).result()
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, parse_pool:
+        fetches = {
+            fetch_pool.submit(_fetch_site, s, site_id): site_id for site_id in sites
+        }
+        parses = {}
+        for future in as_completed(fetches):
+            result = results[fetches[future]]
+            try:
+                tags, keywords = future.result()
+                # tags are small, format them here and send the keywords to be parsed
+                result.tags = tag_frame(tags, result.site_id)
+                if tag_transform is not None:
+                    result.tags = tag_transform(result.tags, result.site_name)
+                result.tags["KeywordCount"] = keyword_count(result.tags)
+                parses[parse_pool.submit(keyword_df, keywords)] = result.site_id
+            except Exception as e:
+                result.error = e
+
+        for future in as_completed(parses):
+            result = results[parses[future]]
+            try:
+                result.keywords = future.result()
+                result.keywords["Domain"] = result.site_name
+            except Exception as e:
+                result.error = e
+
+    return results
+
+
+def combine(results: dict) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    concatenates the results of collect_sites_parallel once
+    returns (tag, kw, errors) where errors is {site_id: exception} for the failed sites
+    """
+    ok = [r for r in results.values() if r.ok]
+    errors = {r.site_id: r.error for r in results.values() if not r.ok}
+    return concat([r.tags for r in ok]), concat([r.keywords for r in ok]), errors
@@ -0,0 +1,178 @@
+import sqlite3
+import threading
+import datetime as dt
+from typing import Callable, Sequence
+
+import numpy as np
+import pandas as pd
+
+# a rank row is the same row from one day to the next if these match
+RANK_KEYS = ("Keyword", "KeywordDevice", "Domain")
+STATS_KEYS = ("Keyword",)
+
+# columns that change every day without the row changing
+IGNORE_COLUMNS = ("SERP_Date",)
+
+
+def _hash(df: pd.DataFrame) -> np.ndarray:
+    """one int64 per row, SQLite integers are signed"""
+    return pd.util.hash_pandas_object(df, index=False).values.view("int64")
+
+
+class DeltaState:
+    def __init__(self, path: str = "stat-delta.sqlite") -> None:
+        """hash of the last loaded version of every row, per table, in a SQLite file"""
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                tbl TEXT,
+                key INTEGER,
+                hash INTEGER,
+                updated TEXT,
+                PRIMARY KEY (tbl, key)
+            )
+            """)
+        self._db.commit()
+
+    def load(self, table: str) -> pd.Series:
+        """row hashes of a table indexed by key hash"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, hash FROM hashes WHERE tbl = ?", (table,)
+            ).fetchall()
+        keys, hashes = zip(*rows) if rows else ((), ())
+        return pd.Series(
+            np.array(hashes, dtype="int64"), index=np.array(keys, dtype="int64")
+        )
+
+    def save(self, table: str, hashes: dict, date: dt.date) -> None:
+        """stores {key hash: row hash} as the latest version of those rows"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                ((table, k, h, date.isoformat()) for k, h in hashes.items()),
+            )
+            self._db.commit()
+
+    def clear(self, table: str) -> None:
+        """forgets a table, its next run is sent in full"""
+        with self._lock:
+            self._db.execute("DELETE FROM hashes WHERE tbl = ?", (table,))
+            self._db.commit()
+
+
+class DeltaFilter:
+    def __init__(
+        self,
+        state: DeltaState,
+        table: str,
+        keys: Sequence[str] = RANK_KEYS,
+        ignore: Sequence[str] = IGNORE_COLUMNS,
+    ) -> None:
+        """
+        keeps only the rows of a table that are new or changed since the last commit()
+        rows are matched on keys and compared on a hash of every other column but ignore
+        rows are counted per Domain for markers() once they are committed
+        """
+        self.state = state
+        self.table = table
+        self.keys = list(keys)
+        self.ignore = set(ignore)
+        self._previous = None
+        self._pending = {}
+        self._counts = {}
+        self._committed = {}
+
+    def _count(self, df: pd.DataFrame, column: str, mask: np.ndarray) -> None:
+        domains = df["Domain"] if "Domain" in df else pd.Series("", index=df.index)
+        for domain, count in domains[mask].value_counts().items():
+            counts = self._counts.setdefault(
+                domain, {"New": 0, "Changed": 0, "Unchanged": 0}
+            )
+            counts[column] += int(count)
+
+    def changes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """the new and changed rows of df"""
+        if self._previous is None:
+            self._previous = self.state.load(self.table)
+        keys = _hash(df[self.keys])
+        hashes = _hash(df[[c for c in df.columns if c not in self.ignore]])
+        positions = self._previous.index.get_indexer(keys)
+        new = positions == -1
+        # -1 (not seen before) picks the 0 on the end, new rows are masked out anyway
+        previous = np.append(self._previous.values, 0)[positions]
+        changed = ~new & (previous != hashes)
+        self._count(df, "New", new)
+        self._count(df, "Changed", changed)
+        self._count(df, "Unchanged", ~(new | changed))
+        keep = new | changed
+        self._pending.update(zip(keys[keep].tolist(), hashes[keep].tolist()))
+        return df.loc[keep]
+
+    def discard(self, df: pd.DataFrame) -> None:
+        """forgets rows from changes() that failed to load, so they are sent again"""
+        for key in _hash(df[self.keys]).tolist():
+            self._pending.pop(key, None)
+
+    def markers(self, date: dt.date) -> pd.DataFrame:
+        """
+        compact record of the run, one row per Domain with how many committed rows
+        were new, changed and unchanged (left out of the load) on date
+        """
+        return pd.DataFrame(
+            [
+                {"SERP_Date": pd.Timestamp(date), "Domain": d, **c}
+                for d, c in self._committed.items()
+            ],
+            columns=["SERP_Date", "Domain", "New", "Changed", "Unchanged"],
+        )
+
+    def commit(self, date: dt.date = dt.date.today(), counted: bool = True) -> None:
+        """
+        saves the rows sent since the last commit as the new baseline,
+        call it once they have loaded
+        counted=False leaves them out of markers(), for rows counted again when resent
+        """
+        self.state.save(self.table, self._pending, date)
+        if self._previous is not None and self._pending:
+            # the saved hashes replace the ones loaded, without reading the table again
+            pending = pd.Series(
+                np.fromiter(
+                    self._pending.values(), dtype="int64", count=len(self._pending)
+                ),
+                index=np.fromiter(
+                    self._pending, dtype="int64", count=len(self._pending)
+                ),
+            )
+            previous = self._previous[~self._previous.index.isin(pending.index)]
+            self._previous = pd.concat([previous, pending])
+        if counted:
+            for domain, counts in self._counts.items():
+                total = self._committed.setdefault(
+                    domain, {"New": 0, "Changed": 0, "Unchanged": 0}
+                )
+                for column, count in counts.items():
+                    total[column] += count
+        self._pending = {}
+        self._counts = {}
+
+
+class DeltaSink:
+    def __init__(
+        self, sink: Callable[[pd.DataFrame], None], delta: DeltaFilter
+    ) -> None:
+        """sink that only passes on the rows delta says are new or changed"""
+        self.sink = sink
+        self.delta = delta
+
+    def __call__(self, df: pd.DataFrame) -> None:
+        df = self.delta.changes(df)
+        if len(df):
+            self.sink(df)
+
+    def flush(self) -> None:
+        """flushes the wrapped sink, if it holds rows"""
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            flush()
@@ -1,9 +1,6 @@
-from util import get_sites, tag_df, keyword_df
+from util import collect_sites
 from getstat import STAT
-
-import datetime as dt
-
-import pandas as pd
+from store import SnapshotStore
 
 
 def main():
@@ -13,29 +10,11 @@ def main():
     # set the max number of results per response (5000)
     s._set_results(5000)
 
-    # get each of your sites you have access to
-    all_sites = get_sites(s)
-
-    # get all tags and keywords for a site
-    tag = pd.DataFrame()
-    kw = pd.DataFrame()
-    for site_id, site_name in all_sites.items():
-        # tags
-        tag = tag.append(tag_df(s, site_id))
-        tag["KeywordCount"] = tag["Keywords"].apply(
-            lambda x: len(x) if isinstance(x, list) else 0
-        )
-        # keywords
-        keywords = s.keywords(site_id)
-        # format kws in df
-        kw_df = keyword_df(keywords)
-        kw_df["Domain"] = site_name
-        # add it back into main df
-        kw = kw.append(kw_df)
+    # get all tags and keywords for each of your sites you have access to
+    tag, kw = collect_sites(s)
 
     # SAVE
-    ts = dt.datetime.now().isoformat()
-    # Save to tag CSV with current date and time attached
-    tag.to_csv(f"./outputs/tags-{ts}.csv")
-    # Save to kw CSV with current date and time attached
-    kw.to_csv(f"./outputs/kws-{ts}.csv")
+    # Save each table as Parquet, partitioned by today's date and domain
+    store = SnapshotStore("./outputs")
+    store.write("tags", tag)
+    store.write("kws", kw)
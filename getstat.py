@@ -1,41 +1,157 @@
 import json
+import time
+import math
+import threading
 import datetime as dt
-from typing import Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Union, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from rich.console import Console
+from cache import ResponseCache
+from metrics import Hook, MetricsCollector, RequestMetric, redact
+from ratelimit import RateLimiter, backoff
 
+# status codes that mean "try again later" rather than "this request is wrong"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
-def open_close_log_file(func):
+
+def normalize_keyword_ids(keyword_ids: Iterable) -> list:
     """
-    opens log file prior to running the function, and then closes it after the fact
+    turns keyword IDs from any source (ints, strings, floats from pandas, lists of IDs)
+    into unique ID strings, in the order first seen and without blanks/NaN
     """
+    ids = {}
+    for keyword_id in keyword_ids:
+        if isinstance(keyword_id, (list, tuple, set)):
+            ids.update(dict.fromkeys(normalize_keyword_ids(keyword_id)))
+            continue
+        if keyword_id is None:
+            continue
+        if isinstance(keyword_id, float):
+            if math.isnan(keyword_id):
+                continue
+            keyword_id = int(keyword_id)
+        keyword_id = str(keyword_id).strip()
+        if keyword_id:
+            ids[keyword_id] = None
+    return list(ids)
 
-    def wrapper(*args, **kwargs):
-        args[0]._open_log_file()
-        result = func(*args, **kwargs)
-        args[0]._close_log_file()
-        return result
 
-    return wrapper
+def date_windows(start_date: dt.date, end_date: dt.date, days: Optional[int]) -> list:
+    """
+    splits start_date..end_date (inclusive) into [(start, end)] windows of up to days
+    a range no longer than days stays one window, longer ranges are split on fixed
+    boundaries so overlapping ranges share (and cache) the same windows
+    """
+    if not days or (end_date - start_date).days + 1 <= days:
+        return [(start_date, end_date)]
+    windows = []
+    start = start_date
+    while start <= end_date:
+        boundary = (start.toordinal() // days + 1) * days
+        end = min(dt.date.fromordinal(boundary - 1), end_date)
+        windows.append((start, end))
+        start = end + dt.timedelta(days=1)
+    return windows
 
 
 class STAT:
-    def __init__(self, api_key: str) -> None:
-        """STAT class accepts your API key from your app.getstat account"""
+    def __init__(
+        self,
+        api_key: str,
+        pool_size: int = 10,
+        timeout: float = 30.0,
+        keep_alive: bool = True,
+        requests_per_second: Optional[float] = None,
+        requests_per_day: Optional[int] = None,
+        max_retries: int = 5,
+        backoff_factor: float = 1.0,
+        max_backoff: float = 60.0,
+        cache: Optional[ResponseCache] = None,
+        base_url: str = "http://app.getstat.com/api/v2",
+        hooks: Optional[list] = None,
+        window_days: Optional[int] = 31,
+    ) -> None:
+        """
+        STAT class accepts your API key from your app.getstat account
+
+        every endpoint method shares one pooled HTTP session, pool_size sets how many
+        keep-alive connections are held open and how many requests can be in flight
+        at once (across every thread using the client),
+        timeout is the per request timeout in seconds
+
+        requests are throttled client side to requests_per_second / requests_per_day,
+        429 and 5xx responses are retried up to max_retries times with backoff
+
+        pass a cache.ResponseCache to reuse responses across runs (off by default)
+        base_url can point the client at another server, like the benchmarks' mock API
+
+        every page request is recorded as a metrics.RequestMetric in .metrics
+        (per endpoint totals and latency histograms) and passed to each of hooks,
+        API keys are redacted
+
+        date range endpoints (sov, ranking distributions, keyword_ranks) split ranges
+        longer than window_days into windows fetched at once and merged in order,
+        each window is its own request so it is cached on its own (None turns this off)
+        """
         self.API_KEY = api_key
         self.start = 0
         self.results = 1000
         self.engine = "google"
-        self._open_log_file()
-        self.CONSOLE = Console(file=self.log_file, log_time_format="%Y-%m-%d %H:%M:%S")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = self._create_session(pool_size, keep_alive)
+        self.limiter = RateLimiter(requests_per_second, requests_per_day)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self.base_url = base_url.rstrip("/")
+        self.metrics = MetricsCollector()
+        self.hooks = [self.metrics] + list(hooks or [])
+        self.window_days = window_days
+        self._console = None
+        self._console_lock = threading.Lock()
+        # caps requests in flight on this client, however many threads share it
+        self._in_flight = threading.BoundedSemaphore(pool_size)
+
+    def __enter__(self) -> "STAT":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
-    def _open_log_file(self) -> None:
-        self.log_file = open("stat-url.log", "a")
+    def _create_session(self, pool_size: int, keep_alive: bool) -> requests.Session:
+        """creates the connection pooled session used by all requests"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return session
 
-    def _close_log_file(self) -> None:
-        self.log_file.close()
+    def close(self) -> None:
+        """closes the connection pool and the url log"""
+        self.session.close()
+        if self._console is not None:
+            self._console.file.close()
+
+    @property
+    def CONSOLE(self):
+        """url log, rich is imported and stat-url.log opened on the first log"""
+        if self._console is None:
+            with self._console_lock:
+                if self._console is None:
+                    from rich.console import Console
+
+                    self._console = Console(
+                        file=open("stat-url.log", "a"),
+                        log_time_format="%Y-%m-%d %H:%M:%S",
+                    )
+        return self._console
 
     def _set_start(self, start: int):
         """sets the starting point of the API requests"""
@@ -54,7 +170,7 @@ class STAT:
         if parameters is None:
             parameters = ""
         return (
-            f"http://app.getstat.com/api/v2/{self.API_KEY}{sub_string}"
+            f"{self.base_url}/{self.API_KEY}{sub_string}"
             f"?format=json&start={self.start}&results={self.results}{parameters}"
         )
 
@@ -62,34 +178,149 @@ class STAT:
         """checks if there is need to make additional requests"""
         return request_data["Response"].get("nextpage")
 
-    @open_close_log_file
+    def _retry_delay(self, attempt: int, r: Optional[requests.Response]) -> float:
+        """how long to wait before the next attempt, honours a Retry-After header"""
+        delay = backoff(attempt, self.backoff_factor, self.max_backoff)
+        if r is not None and r.headers.get("Retry-After", "").isdigit():
+            delay = max(delay, float(r.headers["Retry-After"]))
+        return delay
+
+    def add_hook(self, hook: Hook) -> None:
+        """calls hook(metric) after every page request"""
+        self.hooks.append(hook)
+
+    def _endpoint(self, url: str) -> str:
+        """endpoint path of a url, ex: /keywords/list"""
+        path = url.split("?")[0]
+        return path[len(f"{self.base_url}/{self.API_KEY}") :]
+
+    def _emit(self, metric: RequestMetric) -> None:
+        """passes a metric to every hook, a broken hook never breaks a request"""
+        for hook in self.hooks:
+            try:
+                hook(metric)
+            except Exception as e:
+                self.CONSOLE.log(f"metrics hook {hook!r} failed: {e!r}")
+
+    def _get(
+        self, url: str, metric: Optional[RequestMetric] = None
+    ) -> requests.Response:
+        """
+        sends a GET through the rate limiter
+        retries throttled (429), server error (5xx) and dropped connections
+        raises requests.HTTPError once retries run out or for any other non 2xx status
+        fills in the status, latency and retries of metric when one is given
+        """
+        if metric is None:
+            metric = RequestMetric(self._endpoint(url), redact(url, self.API_KEY))
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            metric.retries = attempt
+            sent = time.perf_counter()
+            try:
+                with self._in_flight:
+                    r = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                metric.latency = time.perf_counter() - sent
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt, None))
+                continue
+            metric.latency = time.perf_counter() - sent
+            metric.status = r.status_code
+            if r.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                break
+            time.sleep(self._retry_delay(attempt, r))
+        r.raise_for_status()
+        return r
+
+    def _fetch(self, url: str, page: int = 0) -> str:
+        """returns the body for the url, from the cache when there is one"""
+        metric = RequestMetric(self._endpoint(url), redact(url, self.API_KEY), page)
+        try:
+            if self.cache is not None and (body := self.cache.get(url)) is not None:
+                metric.cache_hit = True
+            else:
+                self.CONSOLE.log(metric.url)
+                body = self._get(url, metric).text
+                if self.cache is not None:
+                    self.cache.set(url, body)
+            metric.bytes = len(body)
+            return body
+        except Exception as e:
+            # requests errors carry the full URL, key included
+            metric.error = redact(repr(e), self.API_KEY)
+            raise
+        finally:
+            self._emit(metric)
+
+    def next_url(self, page: dict) -> Optional[str]:
+        """full URL of the page after this one, None if this was the last page"""
+        if next_request := self.check_for_more_data(page):
+            return f"{self.base_url}/{self.API_KEY}{next_request}"
+        return None
+
+    def iter_pages(self, url: str) -> Iterator[dict]:
+        """
+        yields the parsed body of each page starting at the url provided
+        follows nextpage until there is no more data, each body is only parsed once
+        raises requests.HTTPError if a page can't be fetched,
+        so data is never silently cut short
+        """
+        page_number = 0
+        while url:
+            page = json.loads(self._fetch(url, page_number))
+            page_number += 1
+            yield page
+            # if there is another request needed to get all the data move on to that URL
+            url = self.next_url(page)
+
+    def iter_results(self, url: str) -> Iterator[dict]:
+        """yields each record of each page as it arrives"""
+        for page in self.iter_pages(url):
+            result = page["Response"].get("Result", [])
+            # a single record comes back as an object rather than a list
+            if isinstance(result, dict):
+                yield result
+            else:
+                yield from result
+
     def _make_request(
         self, url: str, response: Optional[list] = None, raw: bool = False
     ) -> list:
         """
         makes the HTTP request to the url provided
         will validate the status code starts with 2 before sending back
-        if not a valid class 200 response, the response object is sent back
+        if not a valid class 200 response (after retries) requests.HTTPError is raised
         """
-        self.CONSOLE.log(url)
         if response is None:
             response = []
+        if raw:
+            return next(self.iter_pages(url), response)
+        # save the results to the master list
+        response.extend(self.iter_results(url))
+        return response
 
-        r = requests.get(url)
-        # if we have a class 200 status code
-        if str(r.status_code).startswith("2"):
-            if raw:
-                return json.loads(r.text)
-            # save the results to the master list
-            response += json.loads(r.text)["Response"]["Result"]
-            # if there is another request needed to get all the data call the next_request URL
-            if next_request := self.check_for_more_data(json.loads(r.text)):
-                url = f"http://app.getstat.com/api/v2/{self.API_KEY}{next_request}"
-                return self._make_request(url, response)
-        else:
-            return response
+    def _date_range(
+        self, sub_string: str, parameters: str, start_date: dt.date, end_date: dt.date
+    ) -> list:
+        """
+        results of a date range endpoint, one request per window of window_days
+        windows run at the same time on the session, results are merged in date order
+        """
+        windows = date_windows(start_date, end_date, self.window_days)
 
-        return response
+        def fetch(window: tuple) -> list:
+            start, end = window
+            url = self._define_url(
+                sub_string,
+                f"{parameters}&from_date={start.isoformat()}&to_date={end.isoformat()}",
+            )
+            return self._make_request(url)
+
+        if len(windows) == 1:
+            return fetch(windows[0])
+        return [r for results in self._fan_out(fetch, windows, None) for r in results]
 
     def _sov(
         self,
@@ -99,11 +330,9 @@ class STAT:
         end_date: dt.date,
     ) -> list:
         """main function for pulling tag/site Share of Voice"""
-        url = self._define_url(
-            f"/{tag_or_sites}/sov",
-            f"&id={id}&from_date={start_date.isoformat()}&to_date={end_date.isoformat()}",
+        return self._date_range(
+            f"/{tag_or_sites}/sov", f"&id={id}", start_date, end_date
         )
-        return self._make_request(url)
 
     def _rank(
         self,
@@ -113,11 +342,9 @@ class STAT:
         end_date: dt.date,
     ) -> list:
         """main function for pulling tag/site ranking distributions"""
-        url = self._define_url(
-            "/{tag_or_sites}/ranking_distributions",
-            f"&id={id}&from_date={start_date.isoformat()}&to_date={end_date.isoformat()}",
+        return self._date_range(
+            f"/{tag_or_sites}/ranking_distributions", f"&id={id}", start_date, end_date
         )
-        return self._make_request(url)
 
     def get_sites(self) -> list:
         """lists all sites you have access to"""
@@ -145,7 +372,7 @@ class STAT:
         end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
     ) -> list:
         """returns the Share of Voice for a given tag ID over the given date range"""
-        return self._sov("tag", tag_id, start_date, end_date)
+        return self._sov("tags", tag_id, start_date, end_date)
 
     def get_site_ranks(
         self,
@@ -163,7 +390,7 @@ class STAT:
         end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
     ) -> list:
         """gets a ranking distribution for an entire tag by ID"""
-        return self._rank("tag", tag_id, start_date, end_date)
+        return self._rank("tags", tag_id, start_date, end_date)
 
     def serp(
         self,
@@ -178,6 +405,52 @@ class STAT:
         )
         return self._make_request(url, raw=raw)
 
+    def _fan_out(self, func: Callable, items: list, workers: Optional[int]) -> list:
+        """
+        calls func on every item on a thread pool sharing the session,
+        results keep their order
+        """
+        with ThreadPoolExecutor(max_workers=workers or self.pool_size) as pool:
+            return list(pool.map(func, items))
+
+    def serps_bulk(
+        self,
+        keyword_ids: Iterable,
+        date: dt.date = dt.date.today() - dt.timedelta(days=1),
+        workers: Optional[int] = None,
+    ) -> dict:
+        """
+        pulls the SERP of many keywords for one day (defaults to yesterday)
+        IDs are normalized and deduplicated first, each keyword is requested once
+        returns {keyword_id: serp}
+        """
+        keyword_ids = normalize_keyword_ids(keyword_ids)
+        serps = self._fan_out(lambda k: self.serp(k, date), keyword_ids, workers)
+        return dict(zip(keyword_ids, serps))
+
+    def serps_range(
+        self,
+        keyword_ids: Iterable,
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=7),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+        workers: Optional[int] = None,
+    ) -> dict:
+        """
+        pulls the SERP of many keywords for every day between the dates (inclusive)
+        returns {date: {keyword_id: serp}}
+        """
+        keyword_ids = normalize_keyword_ids(keyword_ids)
+        days = [
+            start_date + dt.timedelta(days=i)
+            for i in range((end_date - start_date).days + 1)
+        ]
+        pairs = [(d, k) for d in days for k in keyword_ids]
+        serps = self._fan_out(lambda p: self.serp(p[1], p[0]), pairs, workers)
+        result = {d: {} for d in days}
+        for (d, k), serp in zip(pairs, serps):
+            result[d][k] = serp
+        return result
+
     def keyword_ranks(
         self,
         keyword_id: Union[int, str],
@@ -185,11 +458,9 @@ class STAT:
         end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
     ) -> list:
         """returns ranking list for a given keyword and date range"""
-        url = self._define_url(
-            "/rankings/list",
-            f"keyword_id={keyword_id}&from_date={start_date.isoformat()}&to_date={end_date.isoformat()}",
+        return self._date_range(
+            "/rankings/list", f"&keyword_id={keyword_id}", start_date, end_date
         )
-        return self._make_request(url)
 
     def keywords(
         self,
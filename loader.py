@@ -0,0 +1,200 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Union
+
+import pandas as pd
+
+from ratelimit import backoff
+
+
+class FileSink:
+    def __init__(self, root: str = "./gbq-local") -> None:
+        """
+        local stand in for googlewrapper.GoogleBigQuery with set_dataset/set_table/send
+        each table is a CSV at {root}/{dataset}/{table}.csv,
+        so loads can be run and checked offline
+        """
+        self.root = root
+        self.dataset = None
+        self.table = None
+
+    def set_dataset(self, dataset: str) -> None:
+        self.dataset = dataset
+
+    def set_table(self, table: str) -> None:
+        self.table = table
+
+    def path(self) -> str:
+        return os.path.join(self.root, self.dataset, f"{self.table}.csv")
+
+    def send(self, df: pd.DataFrame, behavior: str = "append") -> None:
+        """writes df to the table, behavior is append, replace or fail like GBQ"""
+        path = self.path()
+        exists = os.path.exists(path)
+        if exists and behavior == "fail":
+            raise ValueError(f"table {self.dataset}.{self.table} already exists")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        append = exists and behavior == "append"
+        df.to_csv(path, mode="a" if append else "w", header=not append, index=False)
+
+    def read(self, dataset: str, table: str) -> pd.DataFrame:
+        """reads a table back, for checking what was loaded"""
+        return pd.read_csv(os.path.join(self.root, dataset, f"{table}.csv"))
+
+
+@dataclass
+class LoadReport:
+    """
+    how a load went,
+    failed holds (chunk number, chunk, error) of chunks that ran out of retries
+    """
+
+    table: str
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    failed: list = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def __str__(self) -> str:
+        return (
+            f"{self.table}: {self.rows:,} rows in {self.chunks} chunks, "
+            f"{self.seconds:.1f}s ({self.rows_per_sec:,.0f} rows/sec), "
+            f"{len(self.failed)} failed chunks"
+        )
+
+
+class GBQLoader:
+    def __init__(
+        self,
+        client=None,
+        dataset: str = "serp_features",
+        chunk_rows: int = 50_000,
+        max_retries: int = 3,
+        backoff_factor: float = 2.0,
+        credentials: str = "gbq.json",
+    ) -> None:
+        """
+        sends frames to BigQuery in chunks of at most chunk_rows rows
+        one client is shared by every table (created from credentials on first use),
+        pass client=FileSink() to load locally instead
+        each chunk is retried on its own up to max_retries times
+        """
+        self._client = client
+        self.dataset = dataset
+        self.chunk_rows = chunk_rows
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.credentials = credentials
+
+    @property
+    def client(self):
+        if self._client is None:
+            from googlewrapper import GoogleBigQuery
+
+            self._client = GoogleBigQuery(self.credentials)
+        return self._client
+
+    def _chunks(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]]):
+        """splits a frame, or each frame of a stream of frames, into bounded chunks"""
+        frames = [data] if isinstance(data, pd.DataFrame) else data
+        for df in frames:
+            for start in range(0, len(df), self.chunk_rows):
+                yield df.iloc[start : start + self.chunk_rows]
+
+    def _send(self, table: str, chunk: pd.DataFrame, behavior: str) -> None:
+        """sends one chunk, retrying with backoff"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.set_dataset(self.dataset)
+                self.client.set_table(table)
+                self.client.send(chunk, behavior=behavior)
+                return
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(backoff(attempt, self.backoff_factor))
+
+    def load(
+        self,
+        table: str,
+        data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        behavior: str = "append",
+    ) -> LoadReport:
+        """
+        loads a frame, or a stream of frames as the pipeline produces them
+        behavior applies to the first chunk that is sent, the rest are appended after it
+        """
+        report = LoadReport(table)
+        start = time.perf_counter()
+        for chunk in self._chunks(data):
+            try:
+                self._send(table, chunk, behavior if report.rows == 0 else "append")
+                report.rows += len(chunk)
+            except Exception as e:
+                report.failed.append((report.chunks, chunk, e))
+            report.chunks += 1
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def retry_failed(self, report: LoadReport) -> LoadReport:
+        """sends the chunks that failed in an earlier load again"""
+        chunks = [chunk for _, chunk, _ in report.failed]
+        return self.load(report.table, chunks, behavior="append")
+
+
+class TableSink:
+    def __init__(self, loader: GBQLoader, table: str, behavior: str = "append") -> None:
+        """
+        callable sink that loads the frames it is given into one table
+        frames are held until there are loader.chunk_rows rows, then sent as one load,
+        flush() sends whatever is left at the end of a run
+        behavior applies to the first load, later loads are appended
+        reports keeps the LoadReport of every load
+        """
+        self.loader = loader
+        self.table = table
+        self.behavior = behavior
+        self.reports = []
+        self._buffer = []
+        self._buffered = 0
+
+    def __call__(self, df: pd.DataFrame) -> None:
+        if not len(df):
+            return
+        self._buffer.append(df)
+        self._buffered += len(df)
+        if self._buffered >= self.loader.chunk_rows:
+            # full chunks go now, the rest waits for the next frames
+            df = pd.concat(self._buffer)
+            full = len(df) - len(df) % self.loader.chunk_rows
+            self._buffer = [df.iloc[full:]] if full < len(df) else []
+            self._buffered = len(df) - full
+            self._load(df.iloc[:full])
+
+    def _load(self, df: pd.DataFrame) -> None:
+        behavior = self.behavior if not self.rows else "append"
+        self.reports.append(self.loader.load(self.table, df, behavior=behavior))
+
+    def flush(self) -> None:
+        """loads the frames still held"""
+        if self._buffer:
+            df = pd.concat(self._buffer)
+            self._buffer, self._buffered = [], 0
+            self._load(df)
+
+    @property
+    def rows(self) -> int:
+        return sum(r.rows for r in self.reports)
+
+    @property
+    def failed(self) -> list:
+        return [f for r in self.reports for f in r.failed]
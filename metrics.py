@@ -0,0 +1,166 @@
+import bisect
+import hashlib
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional
+
+# upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    30000,
+    float("inf"),
+)
+
+
+def redact(url: str, api_key: str) -> str:
+    """url with the API key hidden, safe for logs"""
+    return url.replace(api_key, "***") if api_key else url
+
+
+def key_label(api_key: str) -> str:
+    """short stable label for an API key, safe for logs, ex: key-3f2a9c1d"""
+    return "key-" + hashlib.sha256(api_key.encode()).hexdigest()[:8]
+
+
+@dataclass
+class RequestMetric:
+    """one page request made by STAT"""
+
+    endpoint: str
+    url: str
+    page: int = 0
+    status: Optional[int] = None
+    latency: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+
+class Histogram:
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS) -> None:
+        """fixed bucket histogram, bounds are the upper edge of each bucket"""
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """upper edge of the bucket the pth percentile is in (max for the last one)"""
+        if not self.count:
+            return 0.0
+        target = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        """running totals for one endpoint"""
+        self.requests = 0
+        self.api_calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.latency_ms = Histogram()
+
+    def add(self, metric: RequestMetric) -> None:
+        self.requests += 1
+        self.retries += metric.retries
+        self.bytes += metric.bytes
+        if metric.cache_hit:
+            self.cache_hits += 1
+        else:
+            # every attempt counts against the STAT quota
+            self.api_calls += 1 + metric.retries
+            self.latency_ms.add(metric.latency * 1000)
+        if metric.error is not None:
+            self.errors += 1
+        if metric.status is not None:
+            self.statuses[metric.status] = self.statuses.get(metric.status, 0) + 1
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "api_calls": self.api_calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "bytes": self.bytes,
+            "mean_ms": self.latency_ms.mean,
+            "p50_ms": self.latency_ms.percentile(50),
+            "p95_ms": self.latency_ms.percentile(95),
+            "p99_ms": self.latency_ms.percentile(99),
+            "max_ms": self.latency_ms.max,
+            "statuses": dict(self.statuses),
+        }
+
+
+class MetricsCollector:
+    def __init__(self) -> None:
+        """aggregates RequestMetrics per endpoint, use it as a STAT hook"""
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, metric: RequestMetric) -> None:
+        with self._lock:
+            self.endpoints.setdefault(metric.endpoint, EndpointStats()).add(metric)
+
+    def summary(self) -> dict:
+        """{endpoint: totals and latency percentiles}"""
+        with self._lock:
+            return {e: s.summary() for e, s in sorted(self.endpoints.items())}
+
+    def to_frame(self):
+        """summary() as a pd.DataFrame, one row per endpoint"""
+        import pandas as pd
+
+        return pd.DataFrame.from_dict(self.summary(), orient="index")
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints = {}
+
+
+class JSONLinesExporter:
+    def __init__(self, path: str = "stat-metrics.jsonl") -> None:
+        """hook that appends every RequestMetric to a JSON lines file"""
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, metric: RequestMetric) -> None:
+        with self._lock, open(self.path, "a") as f:
+            f.write(json.dumps(asdict(metric)) + "\n")
+
+
+# hook(metric) is called after every page request
+Hook = Callable[[RequestMetric], None]
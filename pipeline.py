@@ -0,0 +1,153 @@
+from getstat import STAT
+from schema import RANK_SCHEMA, STATS_SCHEMA, apply_schema
+from util import keyword_df
+
+from typing import Callable, Iterator, Optional, Union
+
+import pandas as pd
+
+# keyword_df column -> output column, in output order
+OUTPUT_COLUMNS = {
+    "Keyword": "Keyword",
+    "KeywordDevice": "KeywordDevice",
+    "Domain": "Domain",
+    "KeywordTags": "KeywordTags",
+    "SERP Date": "SERP_Date",
+    "Google_Rank": "Google_Rank",
+    "Google_BaseRank": "Google_BaseRank",
+    "Google_Url": "Google_Url",
+    "AdvertiserCompetition": "AdvertiserCompetition",
+    "GlobalSearchVolume": "GlobalSearchVolume",
+    "RegionalSearchVolume": "RegionalSearchVolume",
+    "CPC": "CPC",
+    "trend_mar": "trend_mar",
+    "trend_feb": "trend_feb",
+    "trend_jan": "trend_jan",
+    "trend_dec": "trend_dec",
+    "trend_nov": "trend_nov",
+    "trend_oct": "trend_oct",
+    "trend_sep": "trend_sep",
+    "trend_aug": "trend_aug",
+    "trend_jul": "trend_jul",
+    "trend_jun": "trend_jun",
+    "trend_may": "trend_may",
+    "trend_apr": "trend_apr",
+}
+
+RANK_COLUMNS = [
+    "Keyword",
+    "KeywordDevice",
+    "Domain",
+    "KeywordTags",
+    "SERP_Date",
+    "Google_Rank",
+    "Google_BaseRank",
+    "Google_Url",
+]
+
+STATS_COLUMNS = [
+    "Keyword",
+    "AdvertiserCompetition",
+    "GlobalSearchVolume",
+    "RegionalSearchVolume",
+    "CPC",
+    "trend_mar",
+    "trend_feb",
+    "trend_jan",
+    "trend_dec",
+    "trend_nov",
+    "trend_oct",
+    "trend_sep",
+    "trend_aug",
+    "trend_jul",
+    "trend_jun",
+    "trend_may",
+    "trend_apr",
+]
+
+# sink(df) receives each page of rows as it is produced
+Sink = Callable[[pd.DataFrame], None]
+
+
+def select_output(df: pd.DataFrame) -> pd.DataFrame:
+    """picks and renames the keyword_df columns we send out, in a single copy"""
+    df = df[list(OUTPUT_COLUMNS)].rename(columns=OUTPUT_COLUMNS)
+    df["SERP_Date"] = pd.to_datetime(df["SERP_Date"])
+    return df
+
+
+def split_output(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """splits select_output() rows into (ranks, stats), stats without duplicates"""
+    ranks = df[RANK_COLUMNS]
+    stats = df[STATS_COLUMNS].drop_duplicates()
+    return apply_schema(ranks, RANK_SCHEMA), apply_schema(stats, STATS_SCHEMA)
+
+
+def keyword_pages(
+    s: STAT, site_id: Union[int, str], site_name: str
+) -> Iterator[pd.DataFrame]:
+    """yields a site's keywords one page at a time, flattened with keyword_df"""
+    url = s._define_url("/keywords/list", f"&site_id={site_id}")
+    for page in s.iter_pages(url):
+        records = page["Response"].get("Result", [])
+        if isinstance(records, dict):
+            records = [records]
+        if not records:
+            continue
+        df = keyword_df(records)
+        df["Domain"] = site_name
+        yield df
+
+
+class StreamingPipeline:
+    def __init__(
+        self, s: STAT, rank_sink: Sink, stats_sink: Optional[Sink] = None
+    ) -> None:
+        """
+        streams keywords page by page from STAT through
+        flatten -> select/rename -> split into ranks/stats -> sinks
+        only one page is held at a time,
+        so memory stays flat no matter how many keywords there are
+        stats rows already sent in this run are not sent again
+        """
+        self.s = s
+        self.rank_sink = rank_sink
+        self.stats_sink = stats_sink
+        self._seen_stats = set()
+        self.rows = {"ranks": 0, "stats": 0}
+
+    def _new_stats(self, stats: pd.DataFrame) -> pd.DataFrame:
+        """drops stats rows that an earlier page already sent"""
+        hashes = pd.util.hash_pandas_object(stats, index=False)
+        new = ~hashes.isin(self._seen_stats).values
+        self._seen_stats.update(hashes[new])
+        return stats.loc[new]
+
+    def process(self, page: pd.DataFrame) -> None:
+        """sends one keyword_df page through to the sinks"""
+        ranks, stats = split_output(select_output(page))
+        self.rank_sink(ranks)
+        self.rows["ranks"] += len(ranks)
+        if self.stats_sink is not None:
+            stats = self._new_stats(stats)
+            if len(stats):
+                self.stats_sink(stats)
+                self.rows["stats"] += len(stats)
+
+    def run(self, sites: dict) -> dict:
+        """
+        streams every site in {site_id: site_name}, returns rows sent per table
+        sinks with a flush() (like loader.TableSink) are flushed at the end
+        """
+        for site_id, site_name in sites.items():
+            for page in keyword_pages(self.s, site_id, site_name):
+                self.process(page)
+        self.flush()
+        return self.rows
+
+    def flush(self) -> None:
+        """sends on anything the sinks still hold"""
+        for sink in (self.rank_sink, self.stats_sink):
+            flush = getattr(sink, "flush", None)
+            if flush is not None:
+                flush()
@@ -0,0 +1,160 @@
+from getstat import STAT
+from metrics import key_label
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Union
+
+SiteId = Union[int, str]
+
+
+class STATPool:
+    def __init__(
+        self, api_keys: Iterable[str], workers_per_key: int = 4, **kwargs
+    ) -> None:
+        """
+        many STAT accounts used as one
+
+        each API key gets its own STAT client, with its own session, limiter and quota
+        (extra keyword arguments, like requests_per_second, are passed to every client)
+        sites are mapped to the key that owns them and jobs are sharded across the keys,
+        with up to workers_per_key sites of each key running at once
+        keys are only ever shown as their metrics.key_label, clients is {label: STAT}
+        a shared cache.ResponseCache keeps each account's site lists apart
+        """
+        self.clients = {
+            key_label(key): STAT(key, **kwargs) for key in dict.fromkeys(api_keys)
+        }
+        if not self.clients:
+            raise ValueError("STATPool needs at least one API key")
+        self.workers_per_key = workers_per_key
+        self._owners = None
+
+    @classmethod
+    def from_subaccounts(
+        cls,
+        api_key: str,
+        include_parent: bool = True,
+        workers_per_key: int = 4,
+        **kwargs,
+    ) -> "STATPool":
+        """pool of the API keys of every subaccount of an account"""
+        with STAT(api_key, **kwargs) as s:
+            url = s._define_url("/subaccounts/list")
+            keys = [a["ApiKey"] for a in s._make_request(url) if a.get("ApiKey")]
+        if include_parent:
+            keys.insert(0, api_key)
+        return cls(keys, workers_per_key, **kwargs)
+
+    def __enter__(self) -> "STATPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """closes every client"""
+        for s in self.clients.values():
+            s.close()
+
+    def _set_results(self, results: int):
+        """changes the results per page on every client"""
+        for s in self.clients.values():
+            s._set_results(results)
+
+    def _by_key(self, func: Callable[[STAT], object]) -> dict:
+        """runs func(client) for every key at once, returns {key label: result}"""
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as pool:
+            futures = {key: pool.submit(func, s) for key, s in self.clients.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+    def owners(self, refresh: bool = False) -> dict:
+        """
+        {site_id: (key label, site_name)} for every site any key can see
+        a site more than one key can see belongs to the first of them
+        """
+        if self._owners is None or refresh:
+            owners = {}
+            for key, sites in self._by_key(lambda s: s.get_sites()).items():
+                for site in sites:
+                    owners.setdefault(site["Id"], (key, site["Title"]))
+            self._owners = owners
+        return self._owners
+
+    def get_sites(self) -> dict:
+        """{site_id: site_name} of every site in the pool, like util.get_sites"""
+        return {site_id: name for site_id, (_, name) in self.owners().items()}
+
+    def client(self, site_id: SiteId) -> STAT:
+        """the client of the key that owns the site"""
+        owner = self.owners().get(site_id) or self.owners().get(str(site_id))
+        if owner is None:
+            raise KeyError(f"no API key in the pool has access to site {site_id}")
+        return self.clients[owner[0]]
+
+    def shard(self, sites: Optional[Iterable[SiteId]] = None) -> dict:
+        """
+        groups sites (default all of them) by owning key,
+        {key label: {site_id: site_name}}
+        """
+        owners = self.owners()
+        site_ids = owners if sites is None else sites
+        shards = {key: {} for key in self.clients}
+        for site_id in site_ids:
+            if site_id not in owners and str(site_id) in owners:
+                site_id = str(site_id)
+            if site_id not in owners:
+                raise KeyError(f"no API key in the pool has access to site {site_id}")
+            key, name = owners[site_id]
+            shards[key][site_id] = name
+        return {key: sites for key, sites in shards.items() if sites}
+
+    def map_sites(
+        self,
+        func: Callable[[STAT, SiteId, str], object],
+        sites: Optional[Iterable[SiteId]] = None,
+        return_exceptions: bool = False,
+    ) -> dict:
+        """
+        calls func(client, site_id, site_name) for every site with its owner's client,
+        every key works through its own sites at the same time
+        returns {site_id: result},
+        with return_exceptions a failed site's result is its exception
+        """
+        shards = self.shard(sites)
+
+        def run_shard(key: str) -> dict:
+            s = self.clients[key]
+
+            def run_site(item: tuple):
+                try:
+                    return func(s, *item)
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    return e
+
+            items = list(shards[key].items())
+            with ThreadPoolExecutor(max_workers=self.workers_per_key) as pool:
+                return dict(zip(shards[key], pool.map(run_site, items)))
+
+        with ThreadPoolExecutor(max_workers=len(shards) or 1) as pool:
+            results = list(pool.map(run_shard, shards))
+        return {site_id: r for shard in results for site_id, r in shard.items()}
+
+    def map_keys(self, func: Callable[[STAT, dict], object], sites=None) -> dict:
+        """
+        calls func(client, {site_id: site_name}) once per key with all its sites,
+        for jobs like collector.collect_sites_parallel that take many sites at once
+        returns {key label: result}
+        """
+        shards = self.shard(sites)
+        with ThreadPoolExecutor(max_workers=len(shards) or 1) as pool:
+            futures = {
+                key: pool.submit(func, self.clients[key], s)
+                for key, s in shards.items()
+            }
+        return {key: future.result() for key, future in futures.items()}
+
+    def metrics(self) -> dict:
+        """{key label: request metrics summary}"""
+        return {key: s.metrics.summary() for key, s in self.clients.items()}
@@ -0,0 +1,319 @@
+from getstat import STAT, normalize_keyword_ids
+
+import json
+import os
+import datetime as dt
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# cell values besides a rank
+MISSING = -1
+NOT_RANKING = 0
+
+# same buckets as STAT's ranking_distributions, (name, lowest rank, highest rank)
+RANK_BUCKETS = (
+    ("One", 1, 1),
+    ("Two", 2, 2),
+    ("Three", 3, 3),
+    ("Four", 4, 4),
+    ("Five", 5, 5),
+    ("SixToTen", 6, 10),
+    ("ElevenToTwenty", 11, 20),
+    ("TwentyOneToThirty", 21, 30),
+    ("ThirtyOneToForty", 31, 40),
+    ("FortyOneToFifty", 41, 50),
+    ("FiftyOneToHundred", 51, 100),
+)
+
+
+def _rank(value) -> int:
+    """STAT rank value (string, blank, None or number) as a cell value"""
+    try:
+        rank = int(float(value))
+    except (TypeError, ValueError):
+        return NOT_RANKING
+    return rank if 0 < rank < np.iinfo(np.int16).max else NOT_RANKING
+
+
+class RankStore:
+    def __init__(
+        self,
+        path: str = "rank-history",
+        start_date: Optional[dt.date] = None,
+        days: int = 366,
+        keywords: int = 1024,
+    ) -> None:
+        """
+        date x keyword matrix of Google ranks, memory-mapped from a .npy file under path
+        cells are the rank, 0 for not ranking and -1 for no data yet
+        the matrix starts at start_date (by default the first date added) and grows,
+        forwards or backwards in time, as ranks are added
+        (days / keywords are the starting size)
+        keyword columns are appended to keywords.jsonl as they are added,
+        an existing store at path is opened as it is
+        """
+        self.path = path
+        self.days = days
+        self.keywords = keywords
+        self.start_date = None
+        self.ranks = None
+        self.keyword_ids = []
+        self.sites = []
+        self._columns = {}
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            self.start_date = dt.date.fromisoformat(meta["start_date"])
+            self.ranks = np.load(os.path.join(path, meta["matrix"]), mmap_mode="r+")
+        elif start_date is not None:
+            self._resize(start_date, (days, keywords))
+        if os.path.exists(self._keywords_path):
+            with open(self._keywords_path) as f:
+                for line in f:
+                    self._column(*json.loads(line))
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    @property
+    def _keywords_path(self) -> str:
+        return os.path.join(self.path, "keywords.jsonl")
+
+    @staticmethod
+    def _new_matrix(path: str, shape: tuple) -> np.memmap:
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.int16, shape=shape)
+        matrix[:] = MISSING
+        return matrix
+
+    def _resize(self, start_date: dt.date, shape: tuple) -> None:
+        """
+        moves the matrix to a new start date and/or shape, keeping what is stored
+        the matrix file is named after its start date, meta.json is swapped in after it,
+        so a crash part way leaves either the old or the new store, never a mix
+        """
+        name = f"ranks-{start_date.isoformat()}.npy"
+        path = os.path.join(self.path, name)
+        grown = self._new_matrix(path + ".tmp", shape)
+        if self.ranks is not None:
+            offset = (self.start_date - start_date).days
+            rows, columns = self.ranks.shape
+            grown[offset : offset + rows, :columns] = self.ranks
+        grown.flush()
+        del grown
+        os.replace(path + ".tmp", path)
+
+        old = None
+        if self.start_date != start_date:
+            if self.start_date is not None:
+                old = os.path.join(
+                    self.path, f"ranks-{self.start_date.isoformat()}.npy"
+                )
+            with open(self._meta_path + ".tmp", "w") as f:
+                json.dump({"start_date": start_date.isoformat(), "matrix": name}, f)
+            os.replace(self._meta_path + ".tmp", self._meta_path)
+        self.ranks = None
+        if old is not None:
+            os.remove(old)
+        self.start_date = start_date
+        self.ranks = np.load(path, mmap_mode="r+")
+
+    def flush(self) -> None:
+        """writes the matrix to disk (keywords are written as they are added)"""
+        if self.ranks is not None:
+            self.ranks.flush()
+
+    @property
+    def end_date(self) -> Optional[dt.date]:
+        """last date the matrix has room for"""
+        if self.ranks is None:
+            return None
+        return self.start_date + dt.timedelta(days=self.ranks.shape[0] - 1)
+
+    def _row(self, date) -> int:
+        """row of a date, negative before the start of the matrix"""
+        return (pd.Timestamp(date).date() - self.start_date).days
+
+    def _reserve(self, first: dt.date, last: dt.date, columns: int) -> None:
+        """makes room for the dates first..last and columns keywords, doubling"""
+        if self.ranks is None:
+            days = (last - first).days + 1
+            self._resize(first, (max(self.days, days), max(self.keywords, columns)))
+            return
+        rows, old_columns = self.ranks.shape
+        start = min(first, self.start_date)
+        needed = max(self._row(last) + 1, rows) + (self.start_date - start).days
+        if start == self.start_date and needed <= rows and columns <= old_columns:
+            return
+        shape = (
+            max(needed, rows * 2) if needed > rows else rows,
+            max(columns, old_columns * 2) if columns > old_columns else old_columns,
+        )
+        self._resize(start, shape)
+
+    def _column(self, keyword_id: str, site: Optional[str]) -> Optional[list]:
+        """
+        column of a keyword, adding it if it is new
+        returns the [keyword_id, site] line to log when the keyword or its site is new
+        """
+        if keyword_id not in self._columns:
+            self._columns[keyword_id] = len(self.keyword_ids)
+            self.keyword_ids.append(keyword_id)
+            self.sites.append(site)
+            return [keyword_id, site]
+        column = self._columns[keyword_id]
+        if site is not None and self.sites[column] != site:
+            self.sites[column] = site
+            return [keyword_id, site]
+        return None
+
+    def add(
+        self,
+        keyword_ids: Iterable,
+        dates: Iterable,
+        ranks: Iterable,
+        sites: Optional[Iterable] = None,
+    ) -> None:
+        """stores many (keyword, date, rank) cells, sites names each keyword's site"""
+        keyword_ids = [normalize_keyword_ids([k])[0] for k in keyword_ids]
+        dates = [pd.Timestamp(d).date() for d in dates]
+        if not dates:
+            return
+        sites = [None] * len(keyword_ids) if sites is None else list(sites)
+        # the keyword log is written before the cells, a crash leaves empty columns
+        lines = [self._column(k, s) for k, s in zip(keyword_ids, sites)]
+        lines = [line for line in lines if line is not None]
+        if lines:
+            with open(self._keywords_path, "a") as f:
+                f.writelines(json.dumps(line) + "\n" for line in lines)
+        self._reserve(min(dates), max(dates), len(self.keyword_ids))
+
+        columns = np.array([self._columns[k] for k in keyword_ids], dtype=np.int64)
+        rows = np.array([self._row(d) for d in dates], dtype=np.int64)
+        self.ranks[rows, columns] = np.array([_rank(r) for r in ranks], dtype=np.int16)
+        self.ranks.flush()
+
+    def add_keyword_ranks(self, keyword_id: Union[int, str], rankings: list) -> None:
+        """stores the output of STAT.keyword_ranks() for a keyword"""
+        self.add(
+            [keyword_id] * len(rankings),
+            [r["date"] for r in rankings],
+            [(r.get("Google") or {}).get("Rank") for r in rankings],
+        )
+
+    def add_keywords(self, kw: pd.DataFrame) -> None:
+        """
+        stores the current ranks in a keyword_df() table
+        (Id, SERP Date, Google_Rank, Domain)
+        """
+        kw = kw.dropna(subset=["SERP Date"])
+        self.add(
+            kw["Id"],
+            kw["SERP Date"],
+            kw["Google_Rank"],
+            kw["Domain"] if "Domain" in kw else None,
+        )
+
+    def missing(
+        self, keyword_id: Union[int, str], start_date: dt.date, end_date: dt.date
+    ):
+        """(first, last) date in the range without data, None if it's all there"""
+        column = self._columns.get(normalize_keyword_ids([keyword_id])[0])
+        if column is None:
+            return start_date, end_date
+        gaps = np.flatnonzero(
+            self._window(start_date, end_date, [column])[:, 0] == MISSING
+        )
+        if not len(gaps):
+            return None
+        return (
+            start_date + dt.timedelta(days=int(gaps[0])),
+            start_date + dt.timedelta(days=int(gaps[-1])),
+        )
+
+    def fill(
+        self,
+        s: STAT,
+        keyword_ids: Iterable,
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> int:
+        """
+        pulls keyword_ranks for only the dates each keyword doesn't have yet
+        returns how many keywords needed a request
+        """
+        requested = 0
+        for keyword_id in normalize_keyword_ids(keyword_ids):
+            gap = self.missing(keyword_id, start_date, end_date)
+            if gap is None:
+                continue
+            self.add_keyword_ranks(keyword_id, s.keyword_ranks(keyword_id, *gap))
+            requested += 1
+        self.flush()
+        return requested
+
+    def _dates(self, start_date: dt.date, end_date: dt.date) -> pd.DatetimeIndex:
+        return pd.date_range(start_date, end_date, freq="D", name="date")
+
+    def _window(
+        self, start_date: dt.date, end_date: dt.date, columns: Optional[list] = None
+    ) -> np.ndarray:
+        """
+        rows for the dates of the columns (default every keyword),
+        MISSING outside the matrix
+        """
+        columns = list(range(len(self.keyword_ids))) if columns is None else columns
+        days = (end_date - start_date).days + 1
+        window = np.full((days, len(columns)), MISSING, np.int16)
+        if self.ranks is None:
+            return window
+        first = self._row(start_date)
+        low, high = max(first, 0), min(first + days, self.ranks.shape[0])
+        if low < high:
+            window[low - first : high - first] = self.ranks[low:high][:, columns]
+        return window
+
+    def history(
+        self, keyword_ids: Iterable, start_date: dt.date, end_date: dt.date
+    ) -> pd.DataFrame:
+        """rank of each keyword (columns) on each date (rows), NA for no data"""
+        keyword_ids = [
+            k for k in normalize_keyword_ids(keyword_ids) if k in self._columns
+        ]
+        columns = [self._columns[k] for k in keyword_ids]
+        window = self._window(start_date, end_date, columns)
+        return pd.DataFrame(
+            window, index=self._dates(start_date, end_date), columns=keyword_ids
+        ).replace(MISSING, pd.NA)
+
+    def distribution(
+        self, start_date: dt.date, end_date: dt.date, site: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        keywords per rank bucket on each date, the same buckets as STAT.get_site_ranks()
+        site limits it to that site's keywords
+        """
+        window = self._window(start_date, end_date)
+        if site is not None:
+            window = window[:, np.array(self.sites, dtype=object) == site]
+        counts = {
+            name: ((window >= low) & (window <= high)).sum(axis=1)
+            for name, low, high in RANK_BUCKETS
+        }
+        counts["NonRanking"] = (
+            (window == NOT_RANKING) | (window > RANK_BUCKETS[-1][2])
+        ).sum(axis=1)
+        return pd.DataFrame(counts, index=self._dates(start_date, end_date))
+
+    def site_distributions(
+        self, start_date: dt.date, end_date: dt.date
+    ) -> pd.DataFrame:
+        """distribution() of every site, one row per (site, date)"""
+        sites = sorted({s for s in self.sites if s is not None})
+        return pd.concat(
+            {site: self.distribution(start_date, end_date, site) for site in sites},
+            names=["site", "date"],
+        )
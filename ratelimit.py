@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        """token bucket that refills `rate` tokens per second up to `capacity`"""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """seconds until `tokens` are available, 0 if they are available now"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """takes the tokens if they are available, returns if it was successful"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1) -> None:
+        """blocks until the tokens are available and takes them"""
+        while not self.try_acquire(tokens):
+            time.sleep(self.wait_time(tokens))
+
+
+class RollingWindow:
+    def __init__(self, limit: int, seconds: float) -> None:
+        """
+        at most `limit` acquires in any `seconds` long window, counted in this process
+        unlike a token bucket it never allows a burst on top of what refilled
+        """
+        self.limit = limit
+        self.seconds = seconds
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._times and self._times[0] <= now - self.seconds:
+            self._times.popleft()
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """seconds until there is room for one more, 0 if there is room now"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._times) < self.limit:
+                return 0.0
+            return self._times[0] + self.seconds - now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """counts one acquire if there is room, returns if it was successful"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._times) >= self.limit:
+                return False
+            self._times.append(now)
+            return True
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        requests_per_day: Optional[int] = None,
+    ) -> None:
+        """
+        client side limit on how fast requests are sent
+        None for either limit means that limit is not enforced
+        """
+        self.buckets = []
+        if requests_per_second:
+            # allow a burst of one second worth of requests
+            self.buckets.append(
+                TokenBucket(requests_per_second, max(1.0, requests_per_second))
+            )
+        if requests_per_day:
+            # a rolling 24h count, a full day bucket allows two days of quota in one
+            self.buckets.append(RollingWindow(requests_per_day, 86400))
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """blocks until every bucket has room for one more request"""
+        # take from all buckets together so a request is never counted twice
+        while True:
+            with self._lock:
+                waits = [bucket.wait_time() for bucket in self.buckets]
+                if not any(waits):
+                    for bucket in self.buckets:
+                        bucket.try_acquire()
+                    return
+            time.sleep(max(waits))
+
+
+def backoff(
+    attempt: int, factor: float = 1.0, maximum: float = 60.0, jitter: bool = True
+) -> float:
+    """exponential backoff in seconds for the given retry attempt (starting at 0)"""
+    delay = min(maximum, factor * (2**attempt))
+    if jitter:
+        # full jitter spreads retries from many workers apart
+        delay = random.uniform(0, delay)
+    return delay
@@ -1,24 +1,48 @@
-from wsgiref.handlers import format_date_time
+from collector import collect_sites_parallel, combine
+from delta import STATS_KEYS, DeltaFilter, DeltaSink, DeltaState
 from getstat import STAT
-from util import get_sites, keyword_df, serp_df, tag_df
+from loader import GBQLoader, TableSink
+from metrics import redact
+from pipeline import StreamingPipeline, select_output, split_output
+from pool import STATPool
+from store import SnapshotStore
+from sync import Checkpoint
+from tagindex import filter_tags, load_tag_sets
+from urlmatch import match_urls
+from util import collect_sites, get_sites, serp_batch
 
 import datetime as dt
+from functools import lru_cache
+from typing import Iterable, Union
 
 import pandas as pd
-from googlewrapper import GoogleBigQuery as GBQ
 
-from rich.console import Console
+# tag sets we filter on, see tag_sets.json
+TAG_SETS = load_tag_sets()
 
-LOG_FILE = open("stat-import.log", "a")
-CONSOLE = Console(file=LOG_FILE, log_time_format="%Y-%m-%d %H:%M:%S")
+
+@lru_cache(maxsize=None)
+def console():
+    """import log, rich is imported and stat-import.log opened on the first log"""
+    from rich.console import Console
+
+    return Console(
+        file=open("stat-import.log", "a"), log_time_format="%Y-%m-%d %H:%M:%S"
+    )
+
+
+@lru_cache(maxsize=None)
+def gbq_loader() -> GBQLoader:
+    """one GBQ client shared by every table we load"""
+    return GBQLoader(dataset="serp_features", credentials="gbq.json")
 
 
 def gbq_import(df: pd.DataFrame, table: str, behavior: str = "append") -> None:
     """send the KW SERP features to GBQ"""
-    gbq = GBQ("gbq.json")
-    gbq.set_dataset("serp_features")
-    gbq.set_table(table)
-    gbq.send(df, behavior=behavior)
+    report = gbq_loader().load(table, df, behavior=behavior)
+    console().log(str(report))
+    for chunk_number, _, error in report.failed:
+        console().log(f"Failed to load chunk {chunk_number} of {table}: {error!r}")
 
 
 def clean_tag_table(df: pd.DataFrame, property_name: str) -> pd.DataFrame:
@@ -28,184 +52,58 @@ def clean_tag_table(df: pd.DataFrame, property_name: str) -> pd.DataFrame:
     return df
 
 
+def clean_topic_table(df: pd.DataFrame, property_name: str) -> pd.DataFrame:
+    """clean the tag results to get the topic categories we want"""
+    df = filter_topic_categories_tags(df)
+    df["Property"] = property_name
+    return df
+
+
 def filter_serp_tags(df: pd.DataFrame) -> pd.DataFrame:
     """filters the tags to the SERP Features we would like"""
-    tags = (
-        "answerbox (all)",
-        "answerbox (owned)",
-        "faq (all)",
-        "faq (owned)",
-        "indented (all)",
-        "indented (owned)",
-        "videos (all)",
-        "videos (owned)",
-    )
-    return df.loc[df["Tag"].isin(tags)].copy()
+    return filter_tags(df, TAG_SETS["serp_features"])
 
 
 def filter_topic_categories_tags(df: pd.DataFrame) -> pd.DataFrame:
     """filters the tags to the SERP Features we would like"""
-    tags = (
-        "buying a house",
-        "credit",
-        "equity & home value",
-        "home improvement & maintenance",
-        "home warranty",
-        "housing market",
-        "interior design",
-        "location",
-        "mortgage",
-        "refinance",
-        "personal finance",
-        "personal loans (transactional)",
-        "real estate agents (transactional)",
-        "renting",
-        "selling a house",
-        "types of dwellings",
-        "types of mortgages",
-    )
-    return df.loc[df["Tag"].isin(tags)].copy()
+    return filter_tags(df, TAG_SETS["topic_categories"])
 
 
 def filter_output_serps(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
-    cols = [
-        "Keyword",
-        "KeywordDevice",
-        "Domain",
-        "KeywordTags",
-        "SERP Date",
-        "Google_Rank",
-        "Google_BaseRank",
-        "Google_Url",
-        "AdvertiserCompetition",
-        "GlobalSearchVolume",
-        "RegionalSearchVolume",
-        "CPC",
-        "trend_mar",
-        "trend_feb",
-        "trend_jan",
-        "trend_dec",
-        "trend_nov",
-        "trend_oct",
-        "trend_sep",
-        "trend_aug",
-        "trend_jul",
-        "trend_jun",
-        "trend_may",
-        "trend_apr",
-    ]
-    df = df[cols].copy()
-    df.columns = [
-        "Keyword",
-        "KeywordDevice",
-        "Domain",
-        "KeywordTags",
-        "SERP_Date",
-        "Google_Rank",
-        "Google_BaseRank",
-        "Google_Url",
-        "AdvertiserCompetition",
-        "GlobalSearchVolume",
-        "RegionalSearchVolume",
-        "CPC",
-        "trend_mar",
-        "trend_feb",
-        "trend_jan",
-        "trend_dec",
-        "trend_nov",
-        "trend_oct",
-        "trend_sep",
-        "trend_aug",
-        "trend_jul",
-        "trend_jun",
-        "trend_may",
-        "trend_apr",
-    ]
-    df["SERP_Date"] = pd.to_datetime(df["SERP_Date"])
-    ranks = df[
-        [
-            "Keyword",
-            "KeywordDevice",
-            "Domain",
-            "KeywordTags",
-            "SERP_Date",
-            "Google_Rank",
-            "Google_BaseRank",
-            "Google_Url",
-        ]
-    ].copy()
-    stats = df[
-        [
-            "Keyword",
-            "AdvertiserCompetition",
-            "GlobalSearchVolume",
-            "RegionalSearchVolume",
-            "CPC",
-            "trend_mar",
-            "trend_feb",
-            "trend_jan",
-            "trend_dec",
-            "trend_nov",
-            "trend_oct",
-            "trend_sep",
-            "trend_aug",
-            "trend_jul",
-            "trend_jun",
-            "trend_may",
-            "trend_apr",
-        ]
-    ].copy()
-    stats = stats.loc[stats.duplicated() == False].copy()
-    return ranks, stats
+    """picks the columns we send out and splits them into the (ranks, stats) tables"""
+    return split_output(select_output(df))
 
 
 def serp_data(
     s: STAT, df: pd.DataFrame, d: dt.date = dt.date.today() - dt.timedelta(days=1)
-) -> dict:
+) -> pd.DataFrame:
     """
     given a df from .tag_df() find the unique keywords
     as well as the SERP associated with the date passed in.
     Defaults to yesterday
+    returns one long table of every keyword's SERP (see util.serps_df)
     """
-    # find the list of keywords we need to get SERP data for
-    unique_keywords = set(df["Keywords"].explode())
-    # create the dictionary
-    master_keyword_serp = {}
-    # loop through each keyword
-    for keyword in list(unique_keywords):
-        # if the keyword is a string (ignores NAN/None) continue
-        if isinstance(keyword, str):
-            # get the SERP Dataframe and add it to the dictionary
-            temp = serp_df(s, keyword, d)
-            master_keyword_serp[keyword] = temp
-
-    return master_keyword_serp
-
-
-def kws_and_tags(api_key) -> tuple:
-    s = STAT(api_key)
-    # set the reults to the maximum of 5000 (up from default of 1000)
-    s._set_results(5000)
-    # pull all the sites we have access to
-    all_sites = get_sites(s)
-
-    # get all tags and keywords for a site
-    tag = pd.DataFrame()
-    kw = pd.DataFrame()
-    for site_id, site_name in all_sites.items():
-        # TAGS
-        tag = tag.append(tag_df(s, site_id))
-        tag["KeywordCount"] = tag["Keywords"].apply(
-            lambda x: len(x) if isinstance(x, list) else 0
-        )
-        # KEYWORDS
-        keywords = s.keywords(site_id)
-        # format the kw table
-        kw_df = keyword_df(keywords)
-        kw_df["Domain"] = site_name
-        # add it back into main df
-        kw = kw.append(kw_df)
-
+    # every keyword across the tags, serp_batch drops NAN/None and duplicates
+    return serp_batch(s, df["Keywords"].explode(), d)
+
+
+def kws_and_tags(api_keys: Union[str, Iterable[str]]) -> tuple:
+    """tags and keywords of every site any of the API keys has access to"""
+    api_keys = [api_keys] if isinstance(api_keys, str) else list(api_keys)
+    with STATPool(api_keys) as pool:
+        # set the reults to the maximum of 5000 (up from default of 1000)
+        pool._set_results(5000)
+        # each key collects the sites it owns at the same time as the others
+        results = pool.map_keys(lambda s, sites: collect_sites_parallel(s, sites))
+    tag, kw, errors = combine(
+        {k: r for shard in results.values() for k, r in shard.items()}
+    )
+    for site_id, error in errors.items():
+        # requests errors carry the full URL, API key included
+        message = repr(error)
+        for key in api_keys:
+            message = redact(message, key)
+        console().log(f"Failed to collect site {site_id}: {message}")
     return tag, kw
 
 
@@ -216,63 +114,96 @@ def moneytips():
 def serp() -> None:
     """main function for pulling the SERP data daily"""
     rocket_api = "970447a91ccf73de3c1dbba0710276dc799a421b"
-    tag, kw = kws_and_tags(rocket_api)
-    kw1 = kw.loc[kw["Domain"] != "MoneyTips"].copy()
-    tag = filter_serp_tags(tag)
-
-    # once we have the data, we need to filter for oclumns we want
-    ranks, stats = filter_output_serps(kw)
-
-    # SAVE -- CSV
+    s = STAT(rocket_api)
+    # set the reults to the maximum of 5000 (up from default of 1000)
+    s._set_results(5000)
     ts = dt.date.today() - dt.timedelta(days=1)
-    # Save to tag CSV with current date and time attached
-    # tag.to_csv(f"./outputs/tags-{ts.isoformat()}.csv")
-    # Save to kw CSV with current date and time attached
-    # kw.to_csv(f"./outputs/kws-{ts.isoformat()}.csv")
-    # CONSOLE.log("Saved tags and kws Locally")
-
-    # SAVE -- GBQ
-    gbq_import(ranks, "ranks")
-    CONSOLE.log("Saved ranking data to GBQ")
+
     # each 25th of the month we will update the stats table
     # by the 21st (pulled on the 22nd) the previous month is included
     # we will pull on the 25th just to make sure.
-    if ts.day == 25:
-        gbq_import(stats, "trends")
-        CONSOLE.log("Saved stats data to GBQ")
+    ranks = TableSink(gbq_loader(), "ranks")
+    stats = TableSink(gbq_loader(), "trends") if ts.day == 25 else None
+
+    # only rows that are new or changed since the last load are sent
+    state = DeltaState("stat-delta.sqlite")
+    rank_delta = DeltaFilter(state, "ranks")
+    stats_delta = DeltaFilter(state, "trends", STATS_KEYS, ())
+    sinks = [(ranks, rank_delta)] + (
+        [(stats, stats_delta)] if stats is not None else []
+    )
+
+    # stream each page of keywords straight through to GBQ
+    pipeline = StreamingPipeline(
+        s,
+        DeltaSink(ranks, rank_delta),
+        DeltaSink(stats, stats_delta) if stats is not None else None,
+    )
+    # a site is checkpointed once all its rows have loaded and their hashes committed,
+    # so running again after a crash picks up at the sites that hadn't finished
+    checkpoint = Checkpoint("serp-checkpoint.sqlite")
+    try:
+        for site_id, site_name in get_sites(s).items():
+            if checkpoint.is_complete(site_id, "/keywords/list", ts):
+                continue
+            if load_site(pipeline, site_id, site_name, sinks, ts):
+                checkpoint.mark_page(site_id, "/keywords/list", ts, 0, None)
+    finally:
+        checkpoint.close()
+        # the marker rows say how many rows of each finished domain were unchanged
+        gbq_import(rank_delta.markers(ts), "ranks_unchanged")
+    console().log(f"Saved {ranks.rows} rows of ranking data to GBQ")
+    if stats is not None:
+        console().log(f"Saved {stats.rows} rows of stats data to GBQ")
+    for sink, _ in sinks:
+        for chunk_number, _, error in sink.failed:
+            console().log(
+                f"Failed to load chunk {chunk_number} of {sink.table}: {error!r}"
+            )
+
+
+def load_site(
+    pipeline: StreamingPipeline,
+    site_id: Union[int, str],
+    site_name: str,
+    sinks: list,
+    date: dt.date,
+) -> bool:
+    """
+    streams one site through the pipeline and commits the rows of it that loaded,
+    sinks is [(TableSink, DeltaFilter)], rows of a failed chunk are sent again next run
+    returns True once every row of the site has loaded
+    """
+    before = [len(sink.failed) for sink, _ in sinks]
+    complete = False
+    try:
+        pipeline.run({site_id: site_name})
+        complete = True
+    finally:
+        # also when the site stops part way, so chunks that did load aren't sent twice
+        pipeline.flush()
+        failures = [sink.failed[start:] for (sink, _), start in zip(sinks, before)]
+        complete = complete and not any(failures)
+        for (_, delta), failed in zip(sinks, failures):
+            for _, chunk, _ in failed:
+                delta.discard(chunk)
+            # an unfinished site is counted in the run that finishes it
+            delta.commit(date, counted=complete)
+    return complete
 
 
 def topics() -> None:
     rocket_api = "970447a91ccf73de3c1dbba0710276dc799a421b"
     s = STAT(rocket_api)
     s._set_results(5000)
-    all_sites = get_sites(s)
 
     # get all tags and keywords for a site
-    tag = pd.DataFrame()
-    kw = pd.DataFrame()
-    for site_id, site_name in all_sites.items():
-        # tags
-        temp = filter_topic_categories_tags(tag_df(s, site_id))
-        temp["Property"] = site_name
-        tag = tag.append(temp)
-        tag["KeywordCount"] = tag["Keywords"].apply(
-            lambda x: len(x) if isinstance(x, list) else 0
-        )
-        # keywords
-        keywords = s.keywords(site_id)
-        # FORMAT THE KW TABLE
-        kw_df = keyword_df(keywords)
-        kw_df["Domain"] = site_name
-        # add it back into main df
-        kw = kw.append(kw_df)
-
-    # SAVE
-    ts = dt.datetime.now().isoformat()
-    # Save to tag CSV with current date and time attached
-    tag.to_csv(f"./outputs/topic-tags-{ts}.csv")
-    # Save to kw CSV with current date and time attached
-    kw.to_csv(f"./outputs/topic-kws-{ts}.csv")
+    tag, kw = collect_sites(s, tag_transform=clean_topic_table)
+
+    # SAVE -- Parquet, partitioned by date and domain
+    store = SnapshotStore("./outputs")
+    store.write("topic-tags", tag)
+    store.write("topic-kws", kw)
 
 
 def debug() -> None:
@@ -302,30 +233,15 @@ def all_urls():
     s.set_tab("STAT Data | All SERP Features")
 
     df = s.get_df(index=0)
-    all_urls = pd.DataFrame(df["URL"].str.split(",").explode("URL"))
-
-    # https://www.geeksforgeeks.org/join-pandas-dataframes-matching-by-substring/
-    all_urls.columns = ["SingleUrl"]
-    all_urls["joiner"] = 1
-    df["joiner"] = 1
-
-    main = df.merge(all_urls, on="joiner").drop("joiner", axis=1)
-
-    all_urls.drop("joiner", axis=1, inplace=True)
-
-    main["match"] = main.apply(lambda x: x.URL.find(x.SingleUrl), axis=1).ge(0)
-
-    final = main[main["match"]].copy()
-    final["dups"] = final.duplicated()
-    final = final.loc[final["dups"] == False].copy()
-    final = final.loc[final["SingleUrl"] != ""].copy()
+    final = match_urls(df)
 
     s.add_tab("Each URL", final)
 
 
 if __name__ == "__main__":
     if False:
-        CONSOLE.log(f"BEGIN process at {dt.datetime.now()}")
+        console().log(f"BEGIN process at {dt.datetime.now()}")
         serp()
-        CONSOLE.log(f"END process at {dt.datetime.now()}")
-    LOG_FILE.close()
+        console().log(f"END process at {dt.datetime.now()}")
+    if console.cache_info().currsize:
+        console().file.close()
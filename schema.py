@@ -0,0 +1,156 @@
+from fnmatch import fnmatchcase
+from typing import Optional
+
+import pandas as pd
+
+# column -> dtype for each table, column names can be wildcards like "Tag_*"
+# in memory: categoricals for repeated strings,
+# nullable small ints for ranks, volumes and trends
+# money and ratios stay float64, float32 can't hold 7.22
+# and widening it later gives 7.21999979
+KEYWORD_SCHEMA = {
+    "Keyword": "string",
+    "KeywordMarket": "category",
+    "KeywordLocation": "category",
+    "KeywordDevice": "category",
+    "KeywordTranslation": "category",
+    "KeywordTags": "category",
+    "CreatedAt": "datetime64[ns]",
+    "Domain": "category",
+    "SERP Date": "datetime64[ns]",
+    "Google_Rank": "Int16",
+    "Google_BaseRank": "Int16",
+    "Google_Url": "category",
+    "AdvertiserCompetition": "float64",
+    "GlobalSearchVolume": "Int32",
+    "RegionalSearchVolume": "Int32",
+    "CPC": "float64",
+    "trend_*": "Int32",
+    "Tag_*": "category",
+}
+
+# what is sent to the GBQ ranks / trends tables, numbers keep the types those tables
+# were created with (float64 ranks, volumes and stats, integer trends)
+RANK_SCHEMA = {
+    "Keyword": "string",
+    "KeywordDevice": "category",
+    "Domain": "category",
+    "KeywordTags": "category",
+    "SERP_Date": "datetime64[ns]",
+    "Google_Rank": "float64",
+    "Google_BaseRank": "float64",
+    "Google_Url": "category",
+}
+
+STATS_SCHEMA = {
+    "Keyword": "string",
+    "AdvertiserCompetition": "float64",
+    "GlobalSearchVolume": "float64",
+    "RegionalSearchVolume": "float64",
+    "CPC": "float64",
+    "trend_*": "Int64",
+}
+
+SERP_SCHEMA = {
+    "keyword_id": "category",
+    "date": "datetime64[ns]",
+    "Rank": "Int16",
+    "BaseRank": "Int16",
+    "Url": "string",
+    "serp_feature_*": "category",
+}
+
+
+def _dtype_for(column: str, schema: dict) -> Optional[str]:
+    """dtype of a column, exact names win over wildcards"""
+    if column in schema:
+        return schema[column]
+    for pattern, dtype in schema.items():
+        if fnmatchcase(str(column), pattern):
+            return dtype
+    return None
+
+
+def _convert(values: pd.Series, dtype: str) -> pd.Series:
+    if str(values.dtype) == dtype:
+        return values
+    if dtype.startswith("datetime"):
+        return pd.to_datetime(values, errors="coerce")
+    if dtype.startswith(("Int", "int", "float", "Float")):
+        # STAT sends numbers as strings, blanks become missing values
+        return pd.to_numeric(values, errors="coerce").astype(dtype)
+    return values.astype(dtype)
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """converts the columns of df named in the schema, leaving the rest as they are"""
+    converted = {}
+    for column in df.columns:
+        dtype = _dtype_for(column, schema)
+        if dtype is not None:
+            converted[column] = _convert(df[column], dtype)
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def union_categories(frames: list) -> list:
+    """
+    gives categorical columns shared by all the frames the same categories,
+    so pd.concat keeps them categorical instead of falling back to object
+    """
+    if len(frames) < 2:
+        return frames
+    columns = dict.fromkeys(c for f in frames for c in f.columns)
+    categories = {}
+    for c in columns:
+        found = [f[c] for f in frames if c in f]
+        if all(isinstance(x.dtype, pd.CategoricalDtype) for x in found):
+            categories[c] = pd.api.types.union_categoricals(found).categories
+    if not categories:
+        return frames
+    return [
+        f.assign(
+            **{c: f[c].cat.set_categories(v) for c, v in categories.items() if c in f}
+        )
+        for f in frames
+    ]
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    """pd.concat that keeps categorical columns categorical"""
+    df = pd.concat(union_categories(frames))
+    # a column some frames don't have comes back as object, make it categorical again
+    lost = [
+        c
+        for c in df.columns
+        if not isinstance(df[c].dtype, pd.CategoricalDtype)
+        and any(c in f and isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames)
+    ]
+    return df.astype({c: "category" for c in lost}) if lost else df
+
+
+def memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """bytes used by each column (deep, so strings are counted) plus a TOTAL row"""
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame(
+        {"dtype": df.dtypes.astype(str), "bytes": usage},
+        index=df.columns,
+    )
+    report.loc["TOTAL"] = ["", int(usage.sum())]
+    report["mb"] = report["bytes"] / 1024**2
+    return report
+
+
+def memory_reports(tables: dict) -> pd.DataFrame:
+    """total memory per table, given {name: df}"""
+    return pd.DataFrame(
+        {
+            name: {
+                "rows": len(df),
+                "columns": len(df.columns),
+                "bytes": int(df.memory_usage(deep=True).sum()),
+            }
+            for name, df in tables.items()
+        }
+    ).T
@@ -0,0 +1,89 @@
+import json
+import os
+import datetime as dt
+from typing import Optional, Sequence
+
+import pandas as pd
+
+# every snapshot gets this column with the date of the run it came from
+SNAPSHOT_DATE = "snapshot_date"
+
+
+def _serialize_nested(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parquet needs one type per column, nested STAT fields (dicts, lists of ids)
+    are stored as JSON strings instead
+    """
+    nested = {}
+    for column in df.select_dtypes(include="object").columns:
+        values = df[column]
+        if values.map(lambda x: isinstance(x, (dict, list))).any():
+            nested[column] = values.map(
+                lambda x: json.dumps(x) if isinstance(x, (dict, list)) else x
+            ).astype("string")
+    return df.assign(**nested) if nested else df
+
+
+class SnapshotStore:
+    def __init__(self, root: str = "./outputs", compression: str = "zstd") -> None:
+        """
+        columnar store of each run's tables as Parquet under root/{table}/
+        partitioned by snapshot date and domain so reads only open the files they need
+        """
+        self.root = root
+        self.compression = compression
+
+    def path(self, table: str) -> str:
+        return os.path.join(self.root, table)
+
+    def write(
+        self,
+        table: str,
+        df: pd.DataFrame,
+        date: Optional[dt.date] = None,
+        partition_cols: Sequence[str] = (SNAPSHOT_DATE, "Domain"),
+    ) -> str:
+        """
+        adds df to the table as the snapshot for date (defaults to today)
+        the partitions df writes to (that date's domains) are replaced if they exist
+        partition columns df doesn't have are skipped, returns the table's path
+        """
+        date = date or dt.date.today()
+        df = _serialize_nested(df).assign(**{SNAPSHOT_DATE: date.isoformat()})
+        df.to_parquet(
+            self.path(table),
+            engine="pyarrow",
+            compression=self.compression,
+            partition_cols=[c for c in partition_cols if c in df],
+            index=False,
+            # writing a snapshot again replaces its partitions instead of adding to them
+            existing_data_behavior="delete_matching",
+        )
+        return self.path(table)
+
+    def read(
+        self,
+        table: str,
+        columns: Optional[list] = None,
+        filters: Optional[list] = None,
+    ) -> pd.DataFrame:
+        """
+        reads a table back, only loading the columns asked for
+        filters are pushed down to the partitions/row groups, ex:
+        store.read("ranks", ["Keyword", "Google_Rank"], [("Domain", "=", "Rocket")])
+        """
+        return pd.read_parquet(
+            self.path(table), engine="pyarrow", columns=columns, filters=filters
+        )
+
+    def snapshots(self, table: str) -> list:
+        """the snapshot dates stored for a table"""
+        path = self.path(table)
+        if not os.path.isdir(path):
+            return []
+        prefix = f"{SNAPSHOT_DATE}="
+        return sorted(
+            dt.date.fromisoformat(d[len(prefix) :])
+            for d in os.listdir(path)
+            if d.startswith(prefix)
+        )
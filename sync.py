@@ -0,0 +1,249 @@
+from getstat import STAT
+
+import sqlite3
+import threading
+import datetime as dt
+from typing import Callable, Optional, Union
+
+# sink(endpoint, id, records) is called once per page / date range that is synced
+Sink = Callable[[str, Union[int, str], list], None]
+
+
+class Checkpoint:
+    def __init__(self, path: str = "stat-checkpoint.sqlite") -> None:
+        """
+        local record of which sync units have finished, stored in a SQLite file
+        a unit is a (site, endpoint, date, page) for paged endpoints
+        or a (id, endpoint, date range) for date ranged endpoints
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                site TEXT,
+                endpoint TEXT,
+                date TEXT,
+                page INTEGER,
+                next_url TEXT,
+                PRIMARY KEY (site, endpoint, date, page)
+            );
+            CREATE TABLE IF NOT EXISTS ranges (
+                id TEXT,
+                endpoint TEXT,
+                start_date TEXT,
+                end_date TEXT
+            );
+            """)
+        self._db.commit()
+
+    def last_page(
+        self, site: Union[int, str], endpoint: str, date: dt.date
+    ) -> Optional[tuple[int, Optional[str]]]:
+        """(page, next_url) of the last finished page, None if none has finished"""
+        with self._lock:
+            return self._db.execute(
+                """
+                SELECT page, next_url FROM pages
+                WHERE site = ? AND endpoint = ? AND date = ?
+                ORDER BY page DESC LIMIT 1
+                """,
+                (str(site), endpoint, date.isoformat()),
+            ).fetchone()
+
+    def mark_page(
+        self,
+        site: Union[int, str],
+        endpoint: str,
+        date: dt.date,
+        page: int,
+        next_url: Optional[str],
+    ) -> None:
+        """records a finished page and where the following page starts"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (str(site), endpoint, date.isoformat(), page, next_url),
+            )
+            self._db.commit()
+
+    def is_complete(self, site: Union[int, str], endpoint: str, date: dt.date) -> bool:
+        """True once the last page of a unit has finished"""
+        last = self.last_page(site, endpoint, date)
+        return last is not None and last[1] is None
+
+    def mark_range(
+        self, id: Union[int, str], endpoint: str, start_date: dt.date, end_date: dt.date
+    ) -> None:
+        """records a finished date range (inclusive)"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO ranges VALUES (?, ?, ?, ?)",
+                (str(id), endpoint, start_date.isoformat(), end_date.isoformat()),
+            )
+            self._db.commit()
+
+    def missing_ranges(
+        self, id: Union[int, str], endpoint: str, start_date: dt.date, end_date: dt.date
+    ) -> list:
+        """the (start, end) ranges between start_date and end_date not loaded yet"""
+        with self._lock:
+            done = self._db.execute(
+                "SELECT start_date, end_date FROM ranges WHERE id = ? AND endpoint = ?",
+                (str(id), endpoint),
+            ).fetchall()
+        done = [(dt.date.fromisoformat(a), dt.date.fromisoformat(b)) for a, b in done]
+
+        missing = []
+        day = start_date
+        while day <= end_date:
+            # jump over a loaded range, or extend the current gap by a day
+            covering = [b for a, b in done if a <= day <= b]
+            if covering:
+                day = max(covering) + dt.timedelta(days=1)
+                continue
+            if missing and missing[-1][1] == day - dt.timedelta(days=1):
+                missing[-1] = (missing[-1][0], day)
+            else:
+                missing.append((day, day))
+            day += dt.timedelta(days=1)
+        return missing
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class IncrementalSync:
+    def __init__(self, s: STAT, checkpoint: Checkpoint, sink: Sink) -> None:
+        """
+        pulls STAT data into sink while keeping a checkpoint of what has finished,
+        so a crashed run can be started again and only does the work that is left
+        """
+        self.s = s
+        self.checkpoint = checkpoint
+        self.sink = sink
+
+    def sync_pages(
+        self, site_id: Union[int, str], endpoint: str, url: str, date: dt.date
+    ) -> int:
+        """
+        sends each page of url to the sink and checkpoints it
+        resumes after the last finished page, returns how many pages were synced
+        """
+        if self.checkpoint.is_complete(site_id, endpoint, date):
+            return 0
+        page_number = 0
+        if last := self.checkpoint.last_page(site_id, endpoint, date):
+            page_number, url = last[0] + 1, last[1]
+
+        synced = 0
+        for page in self.s.iter_pages(url):
+            result = page["Response"].get("Result", [])
+            self.sink(
+                endpoint, site_id, [result] if isinstance(result, dict) else result
+            )
+            self.checkpoint.mark_page(
+                site_id, endpoint, date, page_number, self.s.next_url(page)
+            )
+            page_number += 1
+            synced += 1
+        return synced
+
+    def keywords(
+        self, site_id: Union[int, str], date: dt.date = dt.date.today()
+    ) -> int:
+        """syncs a site's keyword list for the day"""
+        url = self.s._define_url("/keywords/list", f"&site_id={site_id}")
+        return self.sync_pages(site_id, "/keywords/list", url, date)
+
+    def tags(self, site_id: Union[int, str], date: dt.date = dt.date.today()) -> int:
+        """syncs a site's tags for the day"""
+        url = self.s._define_url("/tags/list", f"&site_id={site_id}")
+        return self.sync_pages(site_id, "/tags/list", url, date)
+
+    def sites(self, site_ids, date: dt.date = dt.date.today()) -> dict:
+        """syncs tags and keywords of every site, returns {site_id: pages synced}"""
+        return {
+            site_id: self.tags(site_id, date) + self.keywords(site_id, date)
+            for site_id in site_ids
+        }
+
+    def sync_range(
+        self,
+        endpoint: str,
+        id: Union[int, str],
+        start_date: dt.date,
+        end_date: dt.date,
+        fetch: Callable[[Union[int, str], dt.date, dt.date], list],
+    ) -> list:
+        """
+        only requests the parts of start_date - end_date that aren't loaded yet
+        returns the date ranges that were synced
+        """
+        missing = self.checkpoint.missing_ranges(id, endpoint, start_date, end_date)
+        for start, end in missing:
+            self.sink(endpoint, id, fetch(id, start, end))
+            self.checkpoint.mark_range(id, endpoint, start, end)
+        return missing
+
+    def keyword_ranks(
+        self,
+        keyword_id: Union[int, str],
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> list:
+        """syncs the rankings of a keyword over the date range"""
+        return self.sync_range(
+            "/rankings/list", keyword_id, start_date, end_date, self.s.keyword_ranks
+        )
+
+    def site_sov(
+        self,
+        site_id: Union[int, str],
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> list:
+        """syncs the Share of Voice of a site over the date range"""
+        return self.sync_range(
+            "/sites/sov", site_id, start_date, end_date, self.s.get_site_sov
+        )
+
+    def tag_sov(
+        self,
+        tag_id: Union[int, str],
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> list:
+        """syncs the Share of Voice of a tag over the date range"""
+        return self.sync_range(
+            "/tags/sov", tag_id, start_date, end_date, self.s.get_tag_sov
+        )
+
+    def site_ranks(
+        self,
+        site_id: Union[int, str],
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> list:
+        """syncs the ranking distribution of a site over the date range"""
+        return self.sync_range(
+            "/sites/ranking_distributions",
+            site_id,
+            start_date,
+            end_date,
+            self.s.get_site_ranks,
+        )
+
+    def tag_ranks(
+        self,
+        tag_id: Union[int, str],
+        start_date: dt.date = dt.date.today() - dt.timedelta(days=31),
+        end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    ) -> list:
+        """syncs the ranking distribution of a tag over the date range"""
+        return self.sync_range(
+            "/tags/ranking_distributions",
+            tag_id,
+            start_date,
+            end_date,
+            self.s.get_tag_ranks,
+        )
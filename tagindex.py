@@ -0,0 +1,158 @@
+from getstat import normalize_keyword_ids
+
+import json
+import os
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+TAG_SETS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tag_sets.json"
+)
+
+
+def load_tag_sets(path: str = TAG_SETS_FILE) -> dict:
+    """reads the named tag sets ({name: [tags]}) from a JSON config file"""
+    with open(path) as f:
+        return {name: frozenset(tags) for name, tags in json.load(f).items()}
+
+
+def filter_tags(
+    df: pd.DataFrame, tags: Iterable[str], column: str = "Tag"
+) -> pd.DataFrame:
+    """keeps the rows of a .tag_df() table whose tag is in tags"""
+    return df.loc[df[column].isin(frozenset(tags))].copy()
+
+
+class TagIndex:
+    def __init__(self) -> None:
+        """
+        inverted keyword <-> tag index
+        keywords(tag) and tags(keyword) are dictionary lookups,
+        each tag also has a keyword bitmap (built on first use) for fast any/all queries
+        """
+        self._positions = {}
+        self._keyword_list = []
+        self._tag_keywords = {}
+        self._keyword_tags = {}
+        self._bitmaps = {}
+
+    def __len__(self) -> int:
+        return len(self._keyword_list)
+
+    @staticmethod
+    def _key(keyword_id: Union[int, str]) -> str:
+        ids = normalize_keyword_ids([keyword_id])
+        return ids[0] if ids else ""
+
+    def _position(self, keyword_id: str) -> int:
+        if keyword_id not in self._positions:
+            self._positions[keyword_id] = len(self._keyword_list)
+            self._keyword_list.append(keyword_id)
+        return self._positions[keyword_id]
+
+    def add(self, keyword_id: Union[int, str], tags: Iterable[str]) -> None:
+        """adds a keyword to each of the tags"""
+        keyword_id = self._key(keyword_id)
+        self._position(keyword_id)
+        for tag in tags:
+            tag = tag.strip()
+            if not tag:
+                continue
+            self._tag_keywords.setdefault(tag, set()).add(keyword_id)
+            self._keyword_tags.setdefault(keyword_id, set()).add(tag)
+            self._bitmaps.pop(tag, None)
+
+    def add_tag_df(self, df: pd.DataFrame) -> "TagIndex":
+        """indexes a .tag_df() table (Tag, Keywords)"""
+        for tag, keywords in zip(df["Tag"], df["Keywords"]):
+            for keyword_id in normalize_keyword_ids([keywords]):
+                self.add(keyword_id, [tag])
+        return self
+
+    def add_keyword_df(self, df: pd.DataFrame, id_column: str = "Id") -> "TagIndex":
+        """indexes a keyword_df() table from its comma separated KeywordTags"""
+        for keyword_id, tags in zip(df[id_column], df["KeywordTags"]):
+            if isinstance(tags, str):
+                self.add(keyword_id, tags.split(","))
+        return self
+
+    @classmethod
+    def from_frames(
+        cls, tag: pd.DataFrame = None, kw: pd.DataFrame = None
+    ) -> "TagIndex":
+        """builds an index from a .tag_df() and/or keyword_df() table"""
+        index = cls()
+        if tag is not None:
+            index.add_tag_df(tag)
+        if kw is not None:
+            index.add_keyword_df(kw)
+        return index
+
+    def keywords(self, tag: str) -> frozenset:
+        """every keyword ID with the tag"""
+        return frozenset(self._tag_keywords.get(tag, ()))
+
+    def tags(self, keyword_id: Union[int, str]) -> frozenset:
+        """every tag on the keyword"""
+        return frozenset(self._keyword_tags.get(self._key(keyword_id), ()))
+
+    def has(self, keyword_id: Union[int, str], tag: str) -> bool:
+        """True if the keyword has the tag"""
+        position = self._positions.get(self._key(keyword_id))
+        return position is not None and bool(self.bitmap(tag) >> position & 1)
+
+    def all_tags(self) -> list:
+        return sorted(self._tag_keywords)
+
+    def bitmap(self, tag: str) -> int:
+        """the tag's keywords as an int, bit N is set for the Nth keyword indexed"""
+        if tag not in self._bitmaps:
+            # set the bits in a byte buffer so building the bitmap is linear
+            buffer = bytearray(len(self._keyword_list) // 8 + 1)
+            for keyword_id in self._tag_keywords.get(tag, ()):
+                position = self._positions[keyword_id]
+                buffer[position // 8] |= 1 << (position % 8)
+            self._bitmaps[tag] = int.from_bytes(buffer, "little")
+        return self._bitmaps[tag]
+
+    def _decode(self, bitmap: int) -> frozenset:
+        """keyword IDs of the set bits"""
+        # reading the binary string once is linear, shifting the int bit by bit is not
+        bits = bin(bitmap)[:1:-1]
+        return frozenset(self._keyword_list[i] for i, b in enumerate(bits) if b == "1")
+
+    def keywords_any(self, tags: Iterable[str]) -> frozenset:
+        """keywords with at least one of the tags"""
+        bitmap = 0
+        for tag in tags:
+            bitmap |= self.bitmap(tag)
+        return self._decode(bitmap)
+
+    def keywords_all(self, tags: Iterable[str]) -> frozenset:
+        """keywords with every one of the tags"""
+        tags = list(tags)
+        if not tags:
+            return frozenset()
+        bitmap = self.bitmap(tags[0])
+        for tag in tags[1:]:
+            bitmap &= self.bitmap(tag)
+        return self._decode(bitmap)
+
+    def counts(self) -> pd.Series:
+        """number of keywords per tag"""
+        return pd.Series(
+            {tag: len(keywords) for tag, keywords in self._tag_keywords.items()},
+            name="KeywordCount",
+        ).sort_index()
+
+    def membership(self, tags: Iterable[str] = None) -> pd.DataFrame:
+        """sparse keyword x tag table of True/False, for joining back onto frames"""
+        tags = self.all_tags() if tags is None else list(tags)
+        columns = {}
+        for tag in tags:
+            values = np.zeros(len(self._keyword_list), dtype=bool)
+            values[[self._positions[k] for k in self._tag_keywords.get(tag, ())]] = True
+            columns[tag] = pd.arrays.SparseArray(values, fill_value=False)
+        return pd.DataFrame(columns, index=pd.Index(self._keyword_list, name="Id"))
@@ -0,0 +1,88 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from mock_server import MockSTATServer  # noqa: E402
+
+import pipeline  # noqa: E402
+import rocket  # noqa: E402
+from getstat import STAT  # noqa: E402
+from loader import FileSink, GBQLoader  # noqa: E402
+
+KEYWORDS = 300
+
+
+class FlakySink(FileSink):
+    """FileSink that fails every load of ranks rows for the domains in fail"""
+
+    fail = set()
+
+    def send(self, df, behavior="append"):
+        if self.table == "ranks" and df["Domain"].isin(self.fail).any():
+            raise ConnectionError("load failed")
+        super().send(df, behavior)
+
+
+@pytest.fixture
+def run_serp(tmp_path, monkeypatch):
+    """rocket.serp against the mock server, loading into CSVs under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    server = MockSTATServer(sites=4, keywords_per_site=KEYWORDS).start()
+    monkeypatch.setattr(rocket, "STAT", lambda key: STAT(key, base_url=server.base_url))
+
+    def run(chunk_rows=50_000):
+        loader = GBQLoader(
+            client=FlakySink(str(tmp_path / "gbq")), chunk_rows=chunk_rows
+        )
+        monkeypatch.setattr(rocket, "gbq_loader", lambda: loader)
+        rocket.serp()
+        return FileSink(str(tmp_path / "gbq"))
+
+    yield run
+    FlakySink.fail = set()
+    server.stop()
+
+
+def rows_per_site(sink: FileSink) -> dict:
+    return sink.read("serp_features", "ranks")["Domain"].value_counts().to_dict()
+
+
+def test_failed_site_is_resent_alone(run_serp):
+    FlakySink.fail = {"Site 2"}
+    sink = run_serp()
+    assert rows_per_site(sink) == {
+        "Site 1": KEYWORDS,
+        "Site 3": KEYWORDS,
+        "Site 4": KEYWORDS,
+    }
+
+    FlakySink.fail = set()
+    sink = run_serp()
+    assert rows_per_site(sink) == {f"Site {i}": KEYWORDS for i in range(1, 5)}
+    markers = sink.read("serp_features", "ranks_unchanged")
+    assert not markers.duplicated(["SERP_Date", "Domain"]).any()
+    assert sorted(markers["Domain"]) == [f"Site {i}" for i in range(1, 5)]
+
+
+def test_crash_part_way_through_a_site(run_serp, monkeypatch):
+    keyword_pages = pipeline.keyword_pages
+
+    def crashing(s, site_id, site_name):
+        yield from keyword_pages(s, site_id, site_name)
+        if site_name == "Site 3":
+            raise ConnectionError("STAT went away")
+
+    monkeypatch.setattr(pipeline, "keyword_pages", crashing)
+    with pytest.raises(ConnectionError):
+        # small chunks, so part of Site 3 has loaded when it stops
+        run_serp(chunk_rows=100)
+
+    monkeypatch.setattr(pipeline, "keyword_pages", keyword_pages)
+    sink = run_serp(chunk_rows=100)
+    assert rows_per_site(sink) == {f"Site {i}": KEYWORDS for i in range(1, 5)}
+    markers = sink.read("serp_features", "ranks_unchanged")
+    assert not markers.duplicated(["SERP_Date", "Domain"]).any()
@@ -0,0 +1,87 @@
+from collections import deque
+from typing import Iterable
+
+import pandas as pd
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Iterable[str]) -> None:
+        """
+        Aho-Corasick automaton over a set of substrings
+        find(text) returns every pattern found in text in a single pass over it,
+        no matter how many patterns there are
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for pattern in set(patterns):
+            if isinstance(pattern, str) and pattern:
+                self._insert(pattern)
+        self._build()
+
+    def _insert(self, pattern: str) -> None:
+        node = 0
+        for char in pattern:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._out[node].add(pattern)
+
+    def _build(self) -> None:
+        """breadth first pass that sets each node's failure link"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] |= self._out[self._fail[child]]
+
+    def find(self, text: str) -> set:
+        """every pattern that is a substring of text"""
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            if self._out[node]:
+                found |= self._out[node]
+        return found
+
+
+def match_urls(df: pd.DataFrame, column: str = "URL", sep: str = ",") -> pd.DataFrame:
+    """
+    pairs each row with every URL (from the comma separated column across all rows)
+    that is a substring of the row's column, adds SingleUrl, match and dups
+    same rows and index as cross joining every row with every URL and keeping matches,
+    without building the cross join
+    """
+    single_urls = df[column].str.split(sep).explode().tolist()
+    positions = {}
+    for position, url in enumerate(single_urls):
+        positions.setdefault(url, []).append(position)
+    matcher = AhoCorasick(positions)
+
+    rows, urls, index = [], [], []
+    for row, text in enumerate(df[column]):
+        if not isinstance(text, str):
+            continue
+        found = sorted(p for url in matcher.find(text) for p in positions[url])
+        rows.extend([row] * len(found))
+        urls.extend(single_urls[p] for p in found)
+        index.extend(row * len(single_urls) + p for p in found)
+
+    final = df.iloc[rows].reset_index(drop=True)
+    final["SingleUrl"] = urls
+    final["match"] = True
+    final.index = index
+    final["dups"] = final.duplicated()
+    final = final.loc[final["dups"] == False].copy()
+    return final.loc[final["SingleUrl"] != ""].copy()
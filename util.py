@@ -2,9 +2,14 @@ from getstat import STAT
 
 import datetime as dt
 import json
+from typing import Callable, Iterable, Optional, Union
 
 import pandas as pd
 
+from schema import KEYWORD_SCHEMA, SERP_SCHEMA, apply_schema, concat_frames
+
+NAN = float("nan")
+
 
 def save(file: dict, filename: str):
     with open(filename, "w") as f:
@@ -18,51 +23,143 @@ def get_sites(s: STAT) -> dict:
 
 def tag_df(s: STAT, id: str) -> pd.DataFrame:
     """gets a table of the tags"""
-    df = pd.DataFrame(s.get_tags(id))
+    return tag_frame(s.get_tags(id), id)
+
+
+def tag_frame(tags: list, id: str) -> pd.DataFrame:
+    """formats the tags of a site (from .get_tags()) as a table"""
+    df = pd.DataFrame(tags)
     df["Keywords"] = df["Keywords"].apply(pd.Series)["Id"]
     df["site_id"] = id
     return df
 
 
-def keyword_df(kw: list) -> pd.DataFrame:
-    """given a list of kws, parses the dictionary style data and creates tabular rows"""
+def keyword_count(df: pd.DataFrame) -> pd.Series:
+    """number of keywords in each tag of a .tag_df() table"""
+    return df["Keywords"].apply(lambda x: len(x) if isinstance(x, list) else 0)
+
+
+def collect_sites(
+    s: STAT,
+    sites: Optional[dict] = None,
+    tag_transform: Optional[Callable[[pd.DataFrame, str], pd.DataFrame]] = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    pulls the tag and keyword tables for each site (default every site you can see)
+    tag_transform(tags, site_name) can filter or add to each site's tags
+    each site's frames are collected and concatenated once at the end
+    """
+    if sites is None:
+        sites = get_sites(s)
+
+    tags = []
+    kws = []
+    for site_id, site_name in sites.items():
+        # TAGS
+        tag = tag_df(s, site_id)
+        if tag_transform is not None:
+            tag = tag_transform(tag, site_name)
+        tag["KeywordCount"] = keyword_count(tag)
+        tags.append(tag)
+        # KEYWORDS
+        kw = keyword_df(s.keywords(site_id))
+        kw["Domain"] = site_name
+        kws.append(kw)
+
+    return concat(tags), concat(kws)
+
+
+def concat(frames: list) -> pd.DataFrame:
+    """concatenates a list of frames once, an empty list gives an empty frame"""
+    if not frames:
+        return pd.DataFrame()
+    return concat_frames(frames)
+
+
+def _records(values) -> list:
+    """makes every value a dict so missing/NaN nested data reads as empty"""
+    return [v if isinstance(v, dict) else {} for v in values]
+
+
+def _columns(records: list, prefix: str = "", rename=None) -> dict:
+    """
+    builds {column: values} from a list of dicts in one pass per key
+    columns keep the order their keys are first seen in, missing keys are NaN
+    """
+    keys = dict.fromkeys(k for r in records for k in r)
+    rename = rename or (lambda x: x)
+    return {f"{prefix}{rename(k)}": [r.get(k, NAN) for r in records] for k in keys}
+
+
+def keyword_df(kw: list, typed: bool = True) -> pd.DataFrame:
+    """
+    given a list of kws, parses the dictionary style data and creates tabular rows
+    typed applies schema.KEYWORD_SCHEMA (categoricals, nullable ints, datetimes)
+    """
 
     # create the df
     kw_df = pd.DataFrame(kw)
+    columns = {}
 
     # Expand KeywordRanking column (dictionary values)
-    rank = kw_df["KeywordRanking"].apply(pd.Series)
-    google = rank["Google"].apply(pd.Series)
-    google.columns = [f"Google_{x}" for x in google.columns]
-    kw_df["SERP Date"] = pd.to_datetime(rank["date"])
-    kw_df[google.columns] = google
-    kw_df[["Google_BaseRank", "Google_Rank"]] = kw_df[
-        ["Google_BaseRank", "Google_Rank"]
-    ].astype(float)
+    rank = _records(kw_df["KeywordRanking"])
+    columns["SERP Date"] = pd.to_datetime([r.get("date", NAN) for r in rank])
+    google = _columns(_records(r.get("Google") for r in rank), "Google_")
+    for col in ("Google_BaseRank", "Google_Rank"):
+        google[col] = pd.Series(google[col], dtype=object).astype(float).values
+    columns.update(google)
 
     # Expand KeywordStats column (dicitonary values)
-    stats = kw_df["KeywordStats"].apply(pd.Series)
+    stats = _records(kw_df["KeywordStats"])
     stats_columns = [
         "AdvertiserCompetition",
         "GlobalSearchVolume",
         "RegionalSearchVolume",
         "CPC",
     ]
-    kw_df[stats_columns] = stats[stats_columns].astype(float)
+    for col in stats_columns:
+        columns[col] = (
+            pd.Series([x.get(col, NAN) for x in stats], dtype=object)
+            .astype(float)
+            .values
+        )
 
     # Expand the local search trends from KeywordStats column above (dictionary values)
-    local_search_trends = stats["LocalSearchTrendsByMonth"].apply(pd.Series)
-    local_search_trends.columns = [
-        f"trend_{x.lower()}" for x in local_search_trends.columns
-    ]
-    kw_df[local_search_trends.columns] = local_search_trends.astype(int)
+    local_search_trends = _columns(
+        _records(x.get("LocalSearchTrendsByMonth") for x in stats),
+        "trend_",
+        str.lower,
+    )
+    for col, values in local_search_trends.items():
+        columns[col] = pd.Series(values, dtype=object).astype(int).values
 
     # Expand KeywordTags into one column per tag
-    tags = kw_df["KeywordTags"].str.split(",", expand=True)
-    tags.columns = [f"Tag_{x}" for x in tags.columns]
-    kw_df[tags.columns] = tags
-
-    return kw_df
+    # missing tags (None/NaN) end up in Tag_0 as they are, like str.split(expand=True)
+    tags = [x.split(",") if isinstance(x, str) else [x] for x in kw_df["KeywordTags"]]
+    width = max((len(x) for x in tags), default=0)
+    for i in range(width):
+        columns[f"Tag_{i}"] = [x[i] if i < len(x) else None for x in tags]
+
+    # add all the new columns at once rather than one block at a time
+    new = pd.DataFrame(columns, index=kw_df.index)
+    kw_df = pd.concat([kw_df.drop(columns=new.columns, errors="ignore"), new], axis=1)
+    return apply_schema(kw_df, KEYWORD_SCHEMA) if typed else kw_df
+
+
+def _serp_features(result_types) -> dict:
+    """
+    builds the serp_feature_N columns from a ResultTypes column in one pass
+    a single ResultType comes back as a string rather than a list
+    """
+    features = []
+    for x in result_types:
+        x = x.get("ResultType", NAN) if isinstance(x, dict) else NAN
+        features.append(x if isinstance(x, list) else [x])
+    width = max((len(x) for x in features), default=0)
+    return {
+        f"serp_feature_{i}": [x[i] if i < len(x) else NAN for x in features]
+        for i in range(width)
+    }
 
 
 def serp_df(
@@ -71,8 +168,57 @@ def serp_df(
     """calls the serp API and formats as a pd.DataFrame"""
     serp = s.serp(keyword, date)
     df = pd.DataFrame(serp)
-    serp_features = df["ResultTypes"].apply(pd.Series)
-    serp_features = serp_features["ResultType"].apply(pd.Series)
-    serp_features.columns = [f"serp_feature_{x}" for x in serp_features.columns]
-    df[serp_features.columns] = serp_features
-    return df
+    features = pd.DataFrame(_serp_features(df["ResultTypes"]), index=df.index)
+    return pd.concat(
+        [df.drop(columns=features.columns, errors="ignore"), features], axis=1
+    )
+
+
+def serps_df(
+    serps: Iterable[tuple],
+    date: dt.date = dt.date.today() - dt.timedelta(days=1),
+    typed: bool = True,
+) -> pd.DataFrame:
+    """
+    builds one long SERP table from many (keyword_id, serp) pairs in a single pass
+    one row per result with keyword_id and date columns in front of the result fields,
+    followed by the serp_feature_N columns
+    typed applies schema.SERP_SCHEMA
+    """
+    keyword_ids = []
+    results = []
+    for keyword_id, serp in serps:
+        keyword_ids += [keyword_id] * len(serp)
+        results += serp
+    df = pd.DataFrame(results)
+    df.insert(0, "keyword_id", keyword_ids)
+    df.insert(1, "date", pd.Timestamp(date))
+    if "ResultTypes" in df:
+        features = pd.DataFrame(_serp_features(df["ResultTypes"]), index=df.index)
+        df = pd.concat(
+            [df.drop(columns=features.columns, errors="ignore"), features], axis=1
+        )
+    return apply_schema(df, SERP_SCHEMA) if typed else df
+
+
+def serp_batch(
+    s: STAT,
+    keyword_ids: Iterable[Union[int, str]],
+    date: dt.date = dt.date.today() - dt.timedelta(days=1),
+) -> pd.DataFrame:
+    """
+    calls the serp API for every keyword (deduplicated, fetched concurrently)
+    and returns one long SERP table
+    """
+    return serps_df(s.serps_bulk(keyword_ids, date).items(), date)
+
+
+def serp_range_batch(
+    s: STAT,
+    keyword_ids: Iterable[Union[int, str]],
+    start_date: dt.date = dt.date.today() - dt.timedelta(days=7),
+    end_date: dt.date = dt.date.today() - dt.timedelta(days=1),
+) -> pd.DataFrame:
+    """one long SERP table of every keyword on every day between the dates"""
+    serps = s.serps_range(keyword_ids, start_date, end_date)
+    return concat([serps_df(day.items(), date) for date, day in serps.items()])